@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from instrumentation import observe, increment, set_gauge
+
+class Overloaded(Exception):
+    """A concurrency limit turned the request away"""
+
+    def __init__(self, limit):
+        super().__init__(f"Too many concurrent {limit.name} requests, retry in {limit.retry_after}s")
+        self.limit = limit
+
+class ConcurrencyLimit:
+    """Caps how many requests of one kind run at once in this process
+
+    Up to `concurrency` callers run; up to `max_queue` more wait at most
+    `max_wait` seconds for a slot. Anyone beyond that, or still waiting at
+    the deadline, is shed straight away so callers can answer 503 instead
+    of piling up behind slow work.
+    """
+
+    def __init__(self, name, concurrency, max_queue, max_wait, retry_after=1):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def _update_gauges(self):
+        set_gauge('concurrency_active', self.active, limit=self.name)
+        set_gauge('concurrency_queued', self.queued, limit=self.name)
+
+    def _shed(self, reason):
+        self.shed += 1
+        increment('requests_shed_total', limit=self.name, reason=reason)
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if there is room; False if shed"""
+        with self._lock:
+            if self._slots.acquire(blocking=False):
+                self.active += 1
+                self.admitted += 1
+                self._update_gauges()
+                return True
+            if self.queued >= self.max_queue:
+                self._shed('queue_full')
+                return False
+            self.queued += 1
+            self._update_gauges()
+
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.max_wait)
+        observe('concurrency_wait_seconds', time.perf_counter() - start, limit=self.name)
+        with self._lock:
+            self.queued -= 1
+            if acquired:
+                self.active += 1
+                self.admitted += 1
+            else:
+                self._shed('timeout')
+            self._update_gauges()
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self._update_gauges()
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        """Run a block in a slot, raising Overloaded if the limit sheds it"""
+        if not self.acquire():
+            raise Overloaded(self)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self):
+        """Current state for status reporting"""
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'shed': self.shed
+        }
+
+def limit_from_env(name, concurrency, max_queue, max_wait, retry_after=1):
+    """Build a limit whose defaults can be overridden with <NAME>_CONCURRENCY,
+    <NAME>_QUEUE, <NAME>_QUEUE_WAIT_SECONDS and <NAME>_RETRY_AFTER"""
+    prefix = name.upper()
+    return ConcurrencyLimit(
+        name,
+        concurrency=int(os.getenv(f'{prefix}_CONCURRENCY', concurrency)),
+        max_queue=int(os.getenv(f'{prefix}_QUEUE', max_queue)),
+        max_wait=float(os.getenv(f'{prefix}_QUEUE_WAIT_SECONDS', max_wait)),
+        retry_after=int(os.getenv(f'{prefix}_RETRY_AFTER', retry_after))
+    )
@@ -1,6 +1,13 @@
-from flask import Flask, request, jsonify, send_file
-from db_utils import Database
-from cache_utils import RedisCache
+from flask import Flask, request, jsonify, send_file, g
+from db_utils import Database, parse_fields, MOVIE_SUMMARY_FIELDS
+from cache_utils import RedisCache, single_flight, CACHE_DOMAINS, RECOMMENDATION_CACHE_DEPTH, breaker as cache_breaker
+from title_index import load_title_index, refresh_title_index
+from embedding_engine import EmbeddingEngine, EMBEDDINGS_FILE, RECOMMENDATION_METHODS
+from genre_utils import genre_names, popcount, mask_bits, load_genre_lookup
+from compression import compress_response
+from admission import Overloaded, limit_from_env
+import instrumentation
+from instrumentation import stage, cache_result
 import numpy as np
 import pandas as pd
 import matplotlib
@@ -8,10 +15,19 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 import io
+import math
+import cProfile
+import hmac
+import random
+import re
+import uuid
 import psycopg2
 import os
 import json
 import base64
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,6 +38,10 @@ app = Flask(__name__)
 # Configure application
 app.config['CACHE_ENABLED'] = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
 app.config['DEBUG'] = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
+app.config['TITLE_INDEX_REFRESH_SECONDS'] = int(os.getenv('TITLE_INDEX_REFRESH_SECONDS', 60))
+app.config['EMBEDDINGS_DIR'] = os.getenv('EMBEDDINGS_DIR', 'data')
+# Let Postgres build the JSON of search pages and recommendation lists
+app.config['JSON_FAST_PATH'] = os.getenv('JSON_FAST_PATH', 'false').lower() == 'true'
 
 def get_secret(secret_name):
     secret_file = f"/run/secrets/{secret_name}"
@@ -32,6 +52,314 @@ def get_secret(secret_name):
 
 API_KEY = get_secret('api_key')
 
+# Requests carrying X-Profile-Token get a Server-Timing header; with
+# "X-Profile: cprofile" they are also run under cProfile and the dump is
+# stored in PROFILE_DIR. PROFILE_SAMPLE_RATE adds Server-Timing to a random
+# share of all requests.
+PROFILE_TOKEN = get_secret('profile_token')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_DUMP_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+# Only one cProfile profiler can be active in a process at a time
+_profiler_lock = threading.Lock()
+
+MAX_SEARCH_LIMIT = 50
+
+def encode_cursor(values):
+    """Encode a keyset position as an opaque URL-safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+# Columns calculate_evaluation_metrics reads from each movie
+METRICS_FIELDS = ('genre_mask', 'vote_average')
+
+# Columns the similarity chart and wordcloud render from
+VISUALIZATION_FIELDS = ('movie_id', 'title', 'overview')
+
+# Lists deeper than the stored candidate pool, and multi-movie queries, are
+# answered by the embedding engine
+MAX_RECOMMENDATION_LIMIT = 100
+MAX_RECOMMENDATION_SEEDS = 5
+
+# Most suggestions one autocomplete request returns
+MAX_AUTOCOMPLETE_LIMIT = 20
+
+def parse_recommendation_filters(args):
+    """Read genre= (comma separated, all required), year_from=, year_to= and min_rating=
+    
+    Returns the filters for the database layer; raises ValueError on bad values.
+    """
+    filters = {}
+    genres = tuple(genre.strip() for genre in args.get('genre', '').split(',') if genre.strip())
+    if genres:
+        filters['genres'] = genres
+    for name in ('year_from', 'year_to'):
+        if args.get(name):
+            filters[name] = int(args[name])
+            if not 1 <= filters[name] < 9999:
+                raise ValueError(f"{name} is out of range")
+    if args.get('min_rating'):
+        filters['min_rating'] = float(args['min_rating'])
+        if not math.isfinite(filters['min_rating']):
+            raise ValueError("min_rating must be a finite number")
+    return filters
+
+def parse_id_list(value):
+    """Parse a comma separated list of movie ids; raises ValueError on anything else"""
+    try:
+        return tuple(dict.fromkeys(int(part) for part in (value or '').split(',') if part.strip()))
+    except ValueError:
+        raise ValueError(f"invalid movie id list: {value}")
+
+def with_genre_names(movie):
+    """Add the genre names encoded in a movie's genre_mask"""
+    if 'genre_mask' in movie:
+        movie['genre_names'] = genre_names(movie['genre_mask'], shared_state.get('genres'))
+    return movie
+
+def raw_json_response(payload, **raw):
+    """Like jsonify(payload), with each raw value (JSON text) inserted as it is"""
+    body = app.json.dumps(payload)[:-1]
+    for key, text in raw.items():
+        body += f', {json.dumps(key)}: {text}'
+    return app.response_class(body + '}\n', mimetype='application/json')
+
+def project(row, fields):
+    """Keep only the requested keys of a result row"""
+    return with_genre_names({field: row[field] for field in fields if field in row})
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor; raises ValueError if it is malformed"""
+    try:
+        score, popularity, movie_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(score), float(popularity), int(movie_id)
+    except Exception:
+        raise ValueError("malformed cursor")
+
+# Read-only data shared by every request. When served by gunicorn with
+# preload_app this is loaded once in the master before workers are forked,
+# so all workers share the same pages copy-on-write.
+shared_state = {}
+_shared_state_loaders = []
+
+def shared_state_loader(name):
+    """Register a function that loads read-only data into shared_state[name]"""
+    def decorator(func):
+        _shared_state_loaders.append((name, func))
+        return func
+    return decorator
+
+def load_shared_state():
+    """Run every registered loader, keeping the previous value if a loader fails"""
+    for name, loader in _shared_state_loaders:
+        start_time = time.time()
+        try:
+            shared_state[name] = loader()
+            app.logger.info(f"Loaded shared state '{name}' in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            app.logger.error(f"Error loading shared state '{name}': {str(e)}")
+
+@shared_state_loader('title_index')
+def _load_title_index():
+    with Database() as db:
+        if not db.conn:
+            raise RuntimeError("database unavailable")
+        return load_title_index(db)
+
+@shared_state_loader('genres')
+def _load_genre_lookup():
+    with Database() as db:
+        if not db.conn:
+            raise RuntimeError("database unavailable")
+        return load_genre_lookup(db)
+
+@shared_state_loader('embeddings')
+def _load_embeddings():
+    directory = app.config['EMBEDDINGS_DIR']
+    if not os.path.exists(os.path.join(directory, EMBEDDINGS_FILE)):
+        app.logger.warning(f"No embeddings in {directory}; deep and multi-movie recommendations are disabled")
+        return None
+    return EmbeddingEngine.load(directory)
+
+def embedding_recommendations(db, seed_ids, limit, fields, exclude=(), method='centroid', filters=None):
+    """Rank movies with the embedding engine and load their rows (None if it is not loaded)"""
+    engine = shared_state.get('embeddings')
+    if engine is None:
+        return None
+    # The filters select candidates through the movies indexes; the engine ranks them
+    allowed = db.get_movie_ids_matching(filters) if filters else None
+    with stage('embedding'):
+        scored = engine.recommend(seed_ids, limit, exclude, method, allowed)
+    movies = db.get_movies_by_ids([movie_id for movie_id, _ in scored], fields)
+    scores = dict(scored)
+    for movie in movies:
+        movie['similarity_score'] = scores[movie['movie_id']]
+    return movies
+
+_title_index_refresh_lock = threading.Lock()
+
+def _refresh_title_index():
+    try:
+        with Database() as db:
+            if db.conn:
+                shared_state['title_index'] = refresh_title_index(db, shared_state['title_index'])
+    except Exception as e:
+        app.logger.error(f"Error refreshing title index: {str(e)}")
+    finally:
+        _title_index_refresh_lock.release()
+
+def get_title_index():
+    """Return the title index, refreshing it in the background when it is due"""
+    index = shared_state.get('title_index')
+    if index is None:
+        # Not loaded at startup (e.g. database was unavailable); try again now
+        if _title_index_refresh_lock.acquire(blocking=False):
+            try:
+                shared_state['title_index'] = _load_title_index()
+            except Exception as e:
+                app.logger.error(f"Error loading title index: {str(e)}")
+            finally:
+                _title_index_refresh_lock.release()
+        return shared_state.get('title_index')
+
+    due = time.time() - index.last_refresh_check > app.config['TITLE_INDEX_REFRESH_SECONDS']
+    if due and _title_index_refresh_lock.acquire(blocking=False):
+        index.last_refresh_check = time.time()
+        threading.Thread(target=_refresh_title_index, daemon=True).start()
+    return index
+
+def warm_up_renderer():
+    """Render throwaway images so matplotlib and WordCloud load their fonts up front"""
+    try:
+        generate_similarity_chart({'title': 'warm-up'}, [])
+        generate_wordcloud({'overview': 'warm up'}, [])
+    except Exception as e:
+        app.logger.error(f"Error warming up renderer: {str(e)}")
+
+def warm_up_worker():
+    """Check the backends from a freshly forked worker before it accepts traffic"""
+    with Database() as db:
+        db_ready = db.conn is not None and db.execute("SELECT 1")
+
+    cache_ready = True
+    if app.config['CACHE_ENABLED']:
+        with RedisCache() as cache:
+            cache_ready = cache.client is not None
+
+    app.logger.info(f"Worker {os.getpid()} warm-up: database={'ok' if db_ready else 'unavailable'}, "
+                    f"cache={'ok' if cache_ready else 'unavailable'}")
+
+class VisualizationUnavailable(Exception):
+    """The movie or its recommendations do not exist, so there is nothing to render"""
+
+# pyplot keeps global figure state, so renders from different threads must not interleave
+_render_lock = threading.Lock()
+
+# Per-process concurrency budgets. Renders get their own small one (they run
+# one at a time anyway), taken only when an image really has to be drawn, so
+# a burst of cold visualizations cannot hold every worker thread while cached
+# requests wait. Requests over a budget get a 503 with Retry-After.
+render_limit = limit_from_env('render', concurrency=1, max_queue=1, max_wait=5.0, retry_after=5)
+route_limits = {
+    'search': limit_from_env('search', concurrency=4, max_queue=8, max_wait=1.0),
+    'recommendations': limit_from_env('recommendations', concurrency=4, max_queue=8, max_wait=1.0)
+}
+ENDPOINT_LIMITS = {
+    'search_movies': 'search',
+    'autocomplete': 'search',
+    'get_recommendations': 'recommendations',
+    'get_multi_recommendations': 'recommendations'
+}
+
+def overloaded_response(limit):
+    response = jsonify({
+        'status': 'error',
+        'message': f'Service busy, please retry in {limit.retry_after} seconds'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(limit.retry_after)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+def is_profile_admin():
+    token = request.headers.get('X-Profile-Token')
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+@app.before_request
+def start_profiling():
+    """Trace this request if an admin asked for it or it was sampled"""
+    if is_profile_admin():
+        mode = request.headers.get('X-Profile', 'timing')
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        mode = 'timing'
+    else:
+        return None
+    
+    instrumentation.start_trace()
+    g.profile_mode = mode
+    if mode == 'cprofile' and _profiler_lock.acquire(blocking=False):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def finish_profiling(response):
+    """Add the Server-Timing header and store the cProfile dump of a traced request"""
+    mode = g.get('profile_mode')
+    if mode is None:
+        return response
+    
+    start = g.get('request_start')
+    total = time.perf_counter() - start if start is not None else None
+    response.headers['Server-Timing'] = instrumentation.server_timing(instrumentation.finish_trace(), total)
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint}-{uuid.uuid4().hex[:8]}.prof"
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+            response.headers['X-Profile-Dump'] = name
+        except OSError as e:
+            app.logger.error(f"Error storing profile: {str(e)}")
+    elif mode == 'cprofile':
+        # Another request in this process is being profiled
+        response.headers['X-Profile-Dump'] = 'busy'
+    return response
+
+@app.teardown_request
+def stop_profiling(error=None):
+    # Requests that failed before after_request must not leave the profiler running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+    if g.get('profile_mode') is not None:
+        instrumentation.finish_trace()
+
+@app.after_request
+def record_request_latency(response):
+    """Add the request to the per-route latency histogram"""
+    start = g.get('request_start')
+    if start is not None:
+        # The route pattern rather than the path keeps the label set small
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        instrumentation.observe('http_request_duration_seconds', time.perf_counter() - start,
+                                route=route, method=request.method, status=str(response.status_code))
+        instrumentation.dump_snapshot()
+    return response
+
+@app.after_request
+def compress(response):
+    """gzip/brotli JSON (and other text) bodies for clients that accept it"""
+    # Registered last so it runs first and its time counts in the request latency
+    with stage('compress'):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+
 @app.before_request
 def verify_api_key():
     # Skip verification for status endpoint
@@ -46,30 +374,76 @@ def verify_api_key():
     if request.headers.get('X-API-Key') != API_KEY:
         return jsonify({"status": "error", "message": "Unauthorized"}), 401
 
+@app.before_request
+def admit_request():
+    """Hold a slot of the route's concurrency budget, or shed the request"""
+    limit = route_limits.get(ENDPOINT_LIMITS.get(request.endpoint))
+    if limit is None:
+        return None
+    if not limit.acquire():
+        return overloaded_response(limit)
+    g.admission = limit
+
+@app.teardown_request
+def release_admission(error=None):
+    limit = g.pop('admission', None)
+    if limit is not None:
+        limit.release()
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: the process is up and serving, without touching the database or Redis"""
+    return jsonify({'status': 'ok'})
+
 @app.route('/api/status', methods=['GET'])
 def status():
-    """Check API status"""
+    """Check API status (readiness: tests the database and cache connections)"""
     # Test database connection
     db_status = False
     with Database() as db:
-        db_status = db.connect()
+        db_status = db.conn is not None and db.execute("SELECT 1")
     
     # Test cache connection if enabled
+    # (skipped while the circuit breaker is open)
     cache_status = True
     if app.config['CACHE_ENABLED']:
         with RedisCache() as cache:
-            cache_status = cache.connect()
+            cache_status = cache.ping()
     
     return jsonify({
         'status': 'ok',
         'database': 'connected' if db_status else 'disconnected',
         'cache': 'connected' if cache_status else 'disconnected',
-        'cache_enabled': app.config['CACHE_ENABLED']
+        'cache_enabled': app.config['CACHE_ENABLED'],
+        'cache_circuit': cache_breaker.snapshot(),
+        # This worker's budgets; /api/metrics has them summed over all workers
+        'concurrency': {name: limit.snapshot() for name, limit in [('render', render_limit), *route_limits.items()]}
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Latency histograms and cache counters in the Prometheus text format"""
+    return app.response_class(instrumentation.render_prometheus(),
+                              mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiles/<string:name>', methods=['GET'])
+def get_profile(name):
+    """Admin endpoint to download a stored cProfile dump (open with pstats or snakeviz)"""
+    if not is_profile_admin():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    path = os.path.join(PROFILE_DIR, name)
+    if not PROFILE_DUMP_NAME.match(name) or not os.path.isfile(path):
+        return jsonify({'status': 'error', 'message': f'Profile {name} not found'}), 404
+    return send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                     as_attachment=True, download_name=name)
+
 @app.route('/api/search', methods=['GET', 'POST'])
 def search_movies():
-    """Search for movies by title"""
+    """Search for movies by title
+    
+    Optional parameters: fields= (comma separated movie columns), limit= and
+    after= (the next_cursor of the previous page).
+    """
     # Handle both GET and POST requests
     if request.method == 'POST':
         query = request.form.get('movie_title', '').strip()
@@ -84,62 +458,155 @@ def search_movies():
             'message': 'Search query is required'
         }), 400
     
+    try:
+        fields = parse_fields(request.values.get('fields'))
+        limit = max(1, min(int(request.values.get('limit', 10)), MAX_SEARCH_LIMIT))
+        cursor = request.values.get('after', '')
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid parameter: {str(e)}'
+        }), 400
+    
+    # The database compares titles case-insensitively, so queries that differ
+    # only in case or spacing ("The  Matrix", "the matrix") share one cache entry
+    query = ' '.join(query.split())
+    normalized_query = query.lower()
+    variant = f"{','.join(fields)}|{limit}|{cursor}"
+    if app.config['CACHE_ENABLED'] and normalized_query:
+        with RedisCache() as cache:
+            cached_result = cache.get_search_results(normalized_query, variant)
+        if cached_result is not None:
+            app.logger.info(f"Cache hit for search '{normalized_query}'")
+            if isinstance(cached_result, bytes):
+                # A body cached by the JSON fast path
+                return app.response_class(cached_result, mimetype='application/json')
+            return jsonify(cached_result)
+    
     with Database() as db:
-        # Check for exact matches (could be multiple)
-        db.execute("SELECT * FROM movies WHERE LOWER(title) = LOWER(%s)", (query,))
-        exact_matches = db.fetchall()
+        # Check for exact matches (could be multiple); these only lead the first page
+        exact_matches = [] if after else [with_genre_names(movie) for movie in db.get_movies_by_exact_title(query, fields)]
         
         app.logger.info(f"Found {len(exact_matches)} exact matches for '{query}'")
 
-        if exact_matches:
+        if len(exact_matches) == 1:
             # If there's only one exact match, return it as an exact match
-            if len(exact_matches) == 1:
-                app.logger.info(f"Returning single exact match: {exact_matches[0]['title']}")
-                return jsonify({
-                    'status': 'success',
-                    'exact_match': True,
-                    'movie': exact_matches[0]
-                })
-            else:
-                # If there are multiple exact matches, return them as multiple matches
-                app.logger.info(f"Returning {len(exact_matches)} exact matches as similar_movies")
-                return jsonify({
-                    'status': 'success',
-                    'exact_match': False,
-                    'similar_movies': exact_matches
-                })
-        
-        # If no exact match, try partial match
-        db.execute("SELECT * FROM movies WHERE LOWER(title) LIKE LOWER(%s) LIMIT 10", (f'%{query}%',))
-        similar_movies = db.fetchall()
-        
-        app.logger.info(f"Found {len(similar_movies)} partial matches for '{query}'")
-
-        if similar_movies:
-            return jsonify({
+            app.logger.info(f"Returning single exact match: {exact_matches[0]['title']}")
+            result = {
+                'status': 'success',
+                'exact_match': True,
+                'movie': exact_matches[0]
+            }
+        elif exact_matches:
+            # If there are multiple exact matches, return them as multiple matches
+            app.logger.info(f"Returning {len(exact_matches)} exact matches as similar_movies")
+            result = {
                 'status': 'success',
                 'exact_match': False,
-                'similar_movies': similar_movies
-            })
-        
-        # No matches found
+                'similar_movies': exact_matches
+            }
+        elif app.config['JSON_FAST_PATH']:
+            # Ranked fuzzy matching, rendered straight to JSON by Postgres
+            page = db.search_movies_by_title_json(query, limit, fields, after)
+            app.logger.info(f"Found {page['count']} fuzzy matches for '{query}'")
+            next_cursor = encode_cursor(page['last']) if page['count'] == limit else None
+            response = raw_json_response(
+                {'status': 'success', 'exact_match': False, 'next_cursor': next_cursor},
+                similar_movies=page['data']
+            )
+            if app.config['CACHE_ENABLED'] and normalized_query:
+                with RedisCache() as cache:
+                    cache.set_search_results(normalized_query, response.get_data(), variant,
+                                             empty=page['count'] == 0)
+            return response
+        else:
+            # If no exact match, fall back to ranked fuzzy matching
+            similar_movies = db.search_movies_by_title(query, limit, fields, after)
+            
+            app.logger.info(f"Found {len(similar_movies)} fuzzy matches for '{query}'")
+            next_cursor = None
+            if len(similar_movies) == limit:
+                last = similar_movies[-1]
+                next_cursor = encode_cursor([last['match_score'], last['rank_popularity'], last['movie_id']])
+            for movie in similar_movies:
+                del movie['rank_popularity']
+                with_genre_names(movie)
+            
+            result = {
+                'status': 'success',
+                'exact_match': False,
+                'similar_movies': similar_movies,
+                'next_cursor': next_cursor
+            }
+    
+    # Misses are cached too (briefly) since they cost both queries
+    if app.config['CACHE_ENABLED'] and normalized_query:
+        with RedisCache() as cache:
+            cache.set_search_results(normalized_query, result, variant)
+    
+    return jsonify(result)
+
+@app.route('/api/autocomplete', methods=['GET'])
+def autocomplete():
+    """Suggest titles for a prefix, most popular first"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', 8)), MAX_AUTOCOMPLETE_LIMIT))
+    except ValueError as e:
         return jsonify({
-            'status': 'success',
-            'exact_match': False,
-            'similar_movies': []
-        })
+            'status': 'error',
+            'message': f'Invalid parameter: {str(e)}'
+        }), 400
+    
+    index = get_title_index()
+    if index is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Title index is not available'
+        }), 503
+    
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'results': index.complete(query, limit)
+    })
 
 @app.route('/api/recommendations/<int:movie_id>', methods=['GET'])
 def get_recommendations(movie_id):
-    """Get movie recommendations based on movie ID"""
-    limit = int(request.args.get('limit', 5))
+    """Get movie recommendations based on movie ID
+    
+    fields= narrows the movie columns returned (default: the summary shown in
+    the results list). exclude= lists movie ids not to recommend (e.g. ones
+    already seen). genre=, year_from=, year_to= and min_rating= restrict the
+    recommended movies.
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 5)), MAX_RECOMMENDATION_LIMIT))
+        fields = parse_fields(request.args.get('fields'))
+        exclude = parse_id_list(request.args.get('exclude'))
+        filters = parse_recommendation_filters(request.args)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid parameter: {str(e)}'
+        }), 400
+    
+    # The metrics need genres and ratings whatever the caller asked for. The
+    # cache holds the unfiltered summary projection, so wider, deeper or
+    # filtered requests bypass it.
+    query_fields = tuple(dict.fromkeys(fields + METRICS_FIELDS))
+    use_cache = (app.config['CACHE_ENABLED'] and not filters and not exclude
+                 and limit <= RECOMMENDATION_CACHE_DEPTH
+                 and set(query_fields) <= set(MOVIE_SUMMARY_FIELDS))
+    if use_cache:
+        query_fields = MOVIE_SUMMARY_FIELDS
     
     try:
         # First, get the source movie regardless of cache status
         with Database() as db:
             # Check if the movie exists
-            db.execute("SELECT * FROM movies WHERE movie_id = %s", (movie_id,))
-            source_movie = db.fetchone()
+            source_movie = db.get_movie_by_id(movie_id, query_fields)
             
             if not source_movie:
                 app.logger.error(f"Movie with ID {movie_id} not found")
@@ -148,32 +615,54 @@ def get_recommendations(movie_id):
                     'message': f'Movie with ID {movie_id} not found'
                 }), 404
         
-        # Now check cache for recommendations
-        recommendations = None
-        if app.config['CACHE_ENABLED']:
-            with RedisCache() as cache:
-                cached_recs = cache.get_recommendations(movie_id)
-                if cached_recs:
-                    app.logger.info(f"Cache hit for recommendations of movie {movie_id}")
-                    # Filter to requested limit
-                    recommendations = cached_recs[:limit]
-        
-        # If not in cache, get from database
-        if recommendations is None:
+        def fetch_recommendations(fetch_limit):
             with Database() as db:
                 # Log the query we're about to execute
                 app.logger.info(f"Fetching recommendations for movie_id: {movie_id}")
                 
-                # Get recommendations
-                recommendations = db.get_similar_movies(movie_id, limit)
+                recommendations = db.get_similar_movies(
+                    movie_id, fetch_limit, query_fields, dict(filters, exclude=exclude))
+                
+                if len(recommendations) < fetch_limit:
+                    # The stored candidate pool ran out (narrow filters or a deep
+                    # limit): fill the rest with the embedding engine's best matches
+                    seen = exclude + tuple(rec['movie_id'] for rec in recommendations)
+                    recommendations += embedding_recommendations(
+                        db, [movie_id], fetch_limit - len(recommendations), query_fields, seen,
+                        filters=filters) or []
                 
                 # Log how many recommendations we found
                 app.logger.info(f"Found {len(recommendations)} recommendations for movie_id: {movie_id}")
-
-                # Store in cache if enabled
-                if app.config['CACHE_ENABLED'] and recommendations:
-                    with RedisCache() as cache:
-                        cache.set_recommendations(movie_id, recommendations)
+                # None rather than [] so that empty results are not cached
+                return recommendations or None
+        
+        if app.config['JSON_FAST_PATH'] and not use_cache:
+            with Database() as db:
+                page = db.get_similar_movies_json(movie_id, limit, fields, dict(filters, exclude=exclude))
+            # Lists the stored pool cannot fill take the row path below
+            if page['count'] == limit:
+                metrics = calculate_evaluation_metrics(source_movie, [
+                    {'genre_mask': genre_mask, 'vote_average': vote_average}
+                    for genre_mask, vote_average in zip(page['genre_masks'], page['vote_averages'])
+                ])
+                return raw_json_response({
+                    'status': 'success',
+                    'movie_id': movie_id,
+                    'source_movie': project(source_movie, fields),
+                    'metrics': metrics
+                }, recommendations=page['data'])
+        
+        if use_cache:
+            # Concurrent misses for the same movie share one query. The cached
+            # list is always full depth so any limit up to it is served from it.
+            with RedisCache() as cache:
+                recommendations = cache.get_or_compute(
+                    cache.recommendations_key(movie_id),
+                    lambda: fetch_recommendations(RECOMMENDATION_CACHE_DEPTH)
+                )
+        else:
+            recommendations = fetch_recommendations(limit)
+        recommendations = (recommendations or [])[:limit]
         
         if not recommendations:
             app.logger.warning(f"No recommendations found for movie ID {movie_id}")
@@ -188,8 +677,8 @@ def get_recommendations(movie_id):
         return jsonify({
             'status': 'success',
             'movie_id': movie_id,
-            'source_movie': source_movie,
-            'recommendations': recommendations,
+            'source_movie': project(source_movie, fields),
+            'recommendations': [project(rec, fields + ('similarity_score',)) for rec in recommendations],
             'metrics': metrics
         })
     
@@ -202,107 +691,153 @@ def get_recommendations(movie_id):
             'message': f'Error: {str(e)}'
         }), 500
 
+@app.route('/api/recommendations', methods=['GET'])
+def get_multi_recommendations():
+    """Get recommendations for several movies at once
+    
+    ids= lists the seed movies, exclude= movie ids not to recommend and
+    method= how the seeds are combined: centroid (similar to the group as a
+    whole, the default) or fusion (similar to any one of them). The filters
+    of the single-movie endpoint apply as well.
+    """
+    try:
+        seed_ids = parse_id_list(request.args.get('ids'))
+        exclude = parse_id_list(request.args.get('exclude'))
+        filters = parse_recommendation_filters(request.args)
+        limit = max(1, min(int(request.args.get('limit', 10)), MAX_RECOMMENDATION_LIMIT))
+        fields = parse_fields(request.args.get('fields'))
+        method = request.args.get('method', 'centroid')
+        if not seed_ids:
+            raise ValueError("ids is required")
+        if len(seed_ids) > MAX_RECOMMENDATION_SEEDS:
+            raise ValueError(f"at most {MAX_RECOMMENDATION_SEEDS} ids are allowed")
+        if method not in RECOMMENDATION_METHODS:
+            raise ValueError(f"method must be one of {', '.join(RECOMMENDATION_METHODS)}")
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid parameter: {str(e)}'
+        }), 400
+    
+    if shared_state.get('embeddings') is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Multi-movie recommendations are unavailable'
+        }), 503
+    
+    try:
+        with Database() as db:
+            recommendations = embedding_recommendations(db, seed_ids, limit, fields, exclude, method, filters)
+        
+        if not recommendations:
+            return jsonify({
+                'status': 'error',
+                'message': f'No recommendations found for movie IDs {", ".join(map(str, seed_ids))}'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'movie_ids': list(seed_ids),
+            'method': method,
+            'recommendations': [project(rec, fields + ('similarity_score',)) for rec in recommendations]
+        })
+    
+    except Exception as e:
+        app.logger.error(f"Error generating recommendations: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Error: {str(e)}'
+        }), 500
+
+VISUALIZATION_TYPES = ('similarity_chart', 'wordcloud')
+
+def _load_visualization(movie_id, viz_type):
+    """Get the image from the database, or render and store it"""
+    # Check the database before rendering
+    with Database() as db:
+        viz_record = db.get_visualization(movie_id, viz_type)
+        if viz_record and viz_record['image_data']:
+            app.logger.info(f"Database cache hit for {viz_type} of movie {movie_id}")
+            cache_result('postgres', 'hit', 'visualizations')
+            return bytes(viz_record['image_data'])
+        cache_result('postgres', 'miss', 'visualizations')
+        
+        app.logger.info(f"Generating {viz_type} for movie {movie_id}")
+        
+        # First check if the movie exists
+        movie = db.get_movie_by_id(movie_id, VISUALIZATION_FIELDS)
+        if not movie:
+            raise VisualizationUnavailable(f'Movie with ID {movie_id} not found')
+        
+        # Get recommendations
+        recommendations = db.get_similar_movies(movie_id, 5, VISUALIZATION_FIELDS)
+        if not recommendations:
+            raise VisualizationUnavailable(f'No recommendations found for movie ID {movie_id}')
+    
+    # Generate visualization (raises Overloaded when the render budget is used up).
+    # The connection is returned first so a queued render does not hold it.
+    with render_limit.slot():
+        if viz_type == 'similarity_chart':
+            image_data = generate_similarity_chart(movie, recommendations)
+        else:  # wordcloud
+            image_data = generate_wordcloud(movie, recommendations)
+    
+    # Store visualization in database
+    with Database() as db:
+        try:
+            db.execute("""
+                INSERT INTO visualizations (movie_id, visualization_type, image_data)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (movie_id, visualization_type) 
+                DO UPDATE SET image_data = EXCLUDED.image_data, created_at = CURRENT_TIMESTAMP
+            """, (movie_id, viz_type, psycopg2.Binary(image_data)))
+            
+            db.conn.commit()
+            app.logger.info(f"Stored {viz_type} visualization in database for movie {movie_id}")
+        except Exception as e:
+            app.logger.error(f"Error storing visualization: {str(e)}")
+            # Continue even if storage fails - we can still return the generated image
+    
+    return image_data
+
+def fetch_visualization(movie_id, viz_type):
+    """Get a visualization image: Redis first, then the database, then render
+    
+    Concurrent misses for the same image share one database lookup / render.
+    """
+    if app.config.get('CACHE_ENABLED', True):
+        with RedisCache() as cache:
+            return cache.get_or_compute(cache.visualization_key(movie_id, viz_type),
+                                        lambda: _load_visualization(movie_id, viz_type))
+    return single_flight(f"viz:{movie_id}:{viz_type}", lambda: _load_visualization(movie_id, viz_type))
+
+def _prepare_visualization(movie_id, viz_type):
+    try:
+        fetch_visualization(movie_id, viz_type)
+    except (VisualizationUnavailable, Overloaded) as e:
+        app.logger.info(f"Not preparing {viz_type} for movie {movie_id}: {str(e)}")
+    except Exception as e:
+        app.logger.error(f"Error preparing visualization: {str(e)}")
+    finally:
+        _prepare_backlog.release()
+
+# Background renders requested through POST; renders serialize on _render_lock anyway.
+# Past VISUALIZATION_PREPARE_BACKLOG pending ones, requests are not queued
+# (the image is then rendered when it is fetched).
+_prepare_executor = ThreadPoolExecutor(max_workers=int(os.getenv('VISUALIZATION_PREPARE_WORKERS', 2)))
+_prepare_backlog = threading.BoundedSemaphore(int(os.getenv('VISUALIZATION_PREPARE_BACKLOG', 16)))
+
 @app.route('/api/visualization/<string:viz_type>/<int:movie_id>', methods=['GET'])
 def get_visualization(viz_type, movie_id):
     """Get visualization for a movie (similarity chart or wordcloud)"""
-    if viz_type not in ['similarity_chart', 'wordcloud']:
+    if viz_type not in VISUALIZATION_TYPES:
         return jsonify({
             'status': 'error',
             'message': f'Invalid visualization type: {viz_type}'
         }), 400
     
     try:
-        # Check Redis cache first if enabled
-        image_data = None
-        if app.config.get('CACHE_ENABLED', True):
-            with RedisCache() as cache:
-                if cache.client:
-                    cached_viz = cache.get_visualization(movie_id, viz_type)
-                    if cached_viz:
-                        app.logger.info(f"Redis cache hit for {viz_type} of movie {movie_id}")
-                        image_data = cached_viz
-        
-        # If not in Redis, check database
-        if image_data is None:
-            with Database() as db:
-                db.execute("""
-                    SELECT image_data FROM visualizations
-                    WHERE movie_id = %s AND visualization_type = %s
-                """, (movie_id, viz_type))
-                
-                viz_record = db.fetchone()
-                
-                if viz_record and viz_record['image_data']:
-                    app.logger.info(f"Database cache hit for {viz_type} of movie {movie_id}")
-                    image_data = viz_record['image_data']
-                    
-                    # Store in Redis for future faster access
-                    if app.config.get('CACHE_ENABLED', True):
-                        with RedisCache() as cache:
-                            if cache.client:
-                                cache.set_visualization(movie_id, viz_type, image_data)
-        
-        # If still not found, generate the visualization
-        if image_data is None:
-            app.logger.info(f"Generating {viz_type} for movie {movie_id}")
-            
-            # Get the movie and its recommendations
-            with Database() as db:
-                # First check if the movie exists
-                db.execute("SELECT * FROM movies WHERE movie_id = %s", (movie_id,))
-                movie = db.fetchone()
-                
-                if not movie:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'Movie with ID {movie_id} not found'
-                    }), 404
-                
-                # Get recommendations
-                db.execute("""
-                    SELECT m.*, ms.similarity_score
-                    FROM movie_similarities ms
-                    JOIN movies m ON ms.target_movie_id = m.movie_id
-                    WHERE ms.source_movie_id = %s
-                    ORDER BY ms.similarity_score DESC
-                    LIMIT 5
-                """, (movie_id,))
-                
-                recommendations = db.fetchall()
-                
-                if not recommendations:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'No recommendations found for movie ID {movie_id}'
-                    }), 404
-                
-                # Generate visualization
-                if viz_type == 'similarity_chart':
-                    image_data = generate_similarity_chart(movie, recommendations)
-                else:  # wordcloud
-                    image_data = generate_wordcloud(movie, recommendations)
-                
-                # Store visualization in database
-                try:
-                    db.execute("""
-                        INSERT INTO visualizations (movie_id, visualization_type, image_data)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (movie_id, visualization_type) 
-                        DO UPDATE SET image_data = EXCLUDED.image_data, created_at = CURRENT_TIMESTAMP
-                    """, (movie_id, viz_type, psycopg2.Binary(image_data)))
-                    
-                    db.conn.commit()
-                    app.logger.info(f"Stored {viz_type} visualization in database for movie {movie_id}")
-                    
-                    # Also cache in Redis
-                    if app.config.get('CACHE_ENABLED', True):
-                        with RedisCache() as cache:
-                            if cache.client:
-                                cache.set_visualization(movie_id, viz_type, image_data)
-                                app.logger.info(f"Cached {viz_type} visualization in Redis for movie {movie_id}")
-                except Exception as e:
-                    app.logger.error(f"Error storing visualization: {str(e)}")
-                    # Continue even if storage fails - we can still return the generated image
+        image_data = fetch_visualization(movie_id, viz_type)
         
         # Return the visualization
         return send_file(
@@ -310,6 +845,15 @@ def get_visualization(viz_type, movie_id):
             mimetype='image/png',
             as_attachment=False
         )
+    
+    except VisualizationUnavailable as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 404
+    
+    except Overloaded as e:
+        return overloaded_response(e.limit)
             
     except Exception as e:
         app.logger.error(f"Error generating visualization: {str(e)}")
@@ -320,8 +864,37 @@ def get_visualization(viz_type, movie_id):
             'message': f'Error generating visualization: {str(e)}'
         }), 500
 
+@app.route('/api/visualization/<string:viz_type>/<int:movie_id>', methods=['POST'])
+def prepare_visualization(viz_type, movie_id):
+    """Make sure a visualization is cached without downloading it
+    
+    Answers 200 when the image is already in Redis, otherwise 202 and renders
+    it in the background so the GET that follows finds it ready (or joins
+    the render in progress).
+    """
+    if viz_type not in VISUALIZATION_TYPES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid visualization type: {viz_type}'
+        }), 400
+    
+    if app.config.get('CACHE_ENABLED', True):
+        with RedisCache() as cache:
+            if cache.exists(cache.visualization_key(movie_id, viz_type)):
+                return jsonify({'status': 'success', 'ready': True})
+    
+    if _prepare_backlog.acquire(blocking=False):
+        _prepare_executor.submit(_prepare_visualization, movie_id, viz_type)
+    else:
+        instrumentation.increment('requests_shed_total', limit='prepare', reason='queue_full')
+    return jsonify({'status': 'success', 'ready': False}), 202
+
 def generate_similarity_chart(movie, recommendations):
     """Generate a similarity chart for a movie and its recommendations"""
+    with _render_lock, stage('render'):
+        return _render_similarity_chart(movie, recommendations)
+
+def _render_similarity_chart(movie, recommendations):
     plt.figure(figsize=(12, 8))
     
     # Extract titles and scores
@@ -366,6 +939,10 @@ def generate_similarity_chart(movie, recommendations):
 
 def generate_wordcloud(movie, recommendations):
     """Generate a wordcloud for a movie and its recommendations"""
+    with _render_lock, stage('render'):
+        return _render_wordcloud(movie, recommendations)
+
+def _render_wordcloud(movie, recommendations):
     # Combine overviews, filtering out empty or "No overview found" placeholders
     overviews = []
     if movie['overview'] and not movie['overview'].lower().strip() == "no overview found":
@@ -414,25 +991,20 @@ def generate_wordcloud(movie, recommendations):
 
 def calculate_evaluation_metrics(source_movie, recommendations):
     """Calculate evaluation metrics for recommendations"""
-    # 1. Calculate genre overlap
+    with stage('metrics'):
+        return _calculate_evaluation_metrics(source_movie, recommendations)
+
+def _calculate_evaluation_metrics(source_movie, recommendations):
     try:
-        source_genres = json.loads(source_movie['genres']) if isinstance(source_movie['genres'], str) else source_movie['genres']
-        source_genre_names = [g['name'] for g in source_genres]
+        # Genre bitmasks: the source movie first, then each recommendation
+        masks = np.array([source_movie['genre_mask'] or 0] + [rec['genre_mask'] or 0 for rec in recommendations],
+                         dtype=np.uint64)
         
-        genre_overlaps = []
-        for rec in recommendations:
-            rec_genres = json.loads(rec['genres']) if isinstance(rec['genres'], str) else rec['genres']
-            rec_genre_names = [g['name'] for g in rec_genres]
-            
-            # Calculate Jaccard similarity for genres
-            if source_genre_names and rec_genre_names:
-                overlap = len(set(source_genre_names) & set(rec_genre_names)) / len(set(source_genre_names) | set(rec_genre_names))
-            else:
-                overlap = 0
-                
-            genre_overlaps.append(overlap)
-            
-        avg_genre_overlap = sum(genre_overlaps) / len(genre_overlaps) if genre_overlaps else 0
+        # 1. Calculate genre overlap (Jaccard similarity of the genre sets)
+        intersections = popcount(masks[1:] & masks[0])
+        unions = popcount(masks[1:] | masks[0])
+        genre_overlaps = np.divide(intersections, unions, out=np.zeros(len(unions)), where=unions > 0)
+        avg_genre_overlap = float(genre_overlaps.mean()) if len(genre_overlaps) else 0
         
         # 2. Calculate rating difference
         source_rating = float(source_movie['vote_average']) if source_movie['vote_average'] is not None else 0
@@ -444,31 +1016,15 @@ def calculate_evaluation_metrics(source_movie, recommendations):
             
         avg_rating_diff = sum(rating_diffs) / len(rating_diffs) if rating_diffs else 0
         
-        # 3. Calculate content relevance using TF-IDF + Cosine Similarity based on genres
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        from sklearn.metrics.pairwise import cosine_similarity
-        
-        # Create genre feature strings
-        source_genre_feature = ' '.join(source_genre_names)
-        rec_genre_features = [' '.join([g['name'] for g in (json.loads(rec['genres']) if isinstance(rec['genres'], str) else rec['genres'])]) for rec in recommendations]
-        
-        # Combine all genre features for TF-IDF
-        all_genre_features = [source_genre_feature] + rec_genre_features
-        
-        # Check if we have valid genre data
-        if any(all_genre_features) and len(all_genre_features) > 1:
-            # Fit TF-IDF vectorizer on all genre features
-            tfidf = TfidfVectorizer(stop_words='english')
-            tfidf_matrix = tfidf.fit_transform(all_genre_features)
-            
-            # Get similarity between source movie and each recommendation
-            source_vector = tfidf_matrix[0:1]
-            rec_vectors = tfidf_matrix[1:]
-            
-            content_similarities = cosine_similarity(source_vector, rec_vectors)[0]
-            avg_content_relevance = sum(content_similarities) / len(content_similarities) if len(content_similarities) > 0 else 0
-        else:
-            avg_content_relevance = 0
+        # 3. Calculate content relevance: cosine similarity of TF-IDF weighted
+        # genre vectors (smoothed idf over these movies, like TfidfVectorizer)
+        genre_matrix = mask_bits(masks)
+        idf = np.log((1 + len(masks)) / (1 + genre_matrix.sum(axis=0))) + 1
+        weights = genre_matrix * idf
+        norms = np.linalg.norm(weights, axis=1)
+        weights /= np.where(norms == 0, 1, norms)[:, None]
+        content_similarities = weights[1:] @ weights[0]
+        avg_content_relevance = float(content_similarities.mean()) if len(content_similarities) else 0
         
         return {
             'average_genre_overlap': avg_genre_overlap * 100,  # Convert to percentage
@@ -485,36 +1041,69 @@ def calculate_evaluation_metrics(source_movie, recommendations):
             'average_content_relevance': 0
         }
 
-@app.route('/api/clear-visualization-cache', methods=['POST'])
-def clear_visualization_cache():
-    """Admin endpoint to clear all visualization caches"""
+def _collect_stale_cache(domain):
+    """Remove Redis keys left behind by an invalidation (runs in a background thread)"""
     try:
-        # Clear database cache
-        with Database() as db:
-            db.execute("DELETE FROM visualizations")
-            db.conn.commit()
-            
-        # Clear Redis cache if enabled
+        if app.config['CACHE_ENABLED']:
+            with RedisCache() as cache:
+                removed = cache.collect_stale_keys(domain)
+                app.logger.info(f"Unlinked {removed} stale '{domain}' keys from Redis")
+    except Exception as e:
+        app.logger.error(f"Error collecting stale '{domain}' cache: {str(e)}")
+
+@app.route('/api/cache/<string:domain>/invalidate', methods=['POST'])
+def invalidate_cache(domain):
+    """Admin endpoint to invalidate one cache domain (recommendations, visualizations or search)
+    
+    The invalidation itself is a single generation bump; stale Redis keys are
+    removed in the background. Stored visualization images are deleted first,
+    so a render under the new generation cannot read an old one.
+    """
+    if domain not in CACHE_DOMAINS:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown cache domain: {domain}'
+        }), 400
+    
+    try:
+        # Stored images older than now are stale; renders from here on are kept
+        if domain == 'visualizations':
+            with Database() as db:
+                db.execute("SELECT LOCALTIMESTAMP AS cutoff")
+                deleted = db.delete_visualizations_before(db.fetchone()['cutoff'])
+            if deleted is None:
+                raise RuntimeError('could not delete stored visualizations')
+            app.logger.info(f"Deleted {deleted} stored visualizations")
+        
+        generation = None
         if app.config.get('CACHE_ENABLED', True):
             with RedisCache() as cache:
-                if cache.client:
-                    # Delete all keys matching viz:*
-                    keys = cache.client.keys("viz:*")
-                    if keys:
-                        cache.client.delete(*keys)
+                generation = cache.invalidate(domain)
+        
+        threading.Thread(target=_collect_stale_cache, args=(domain,), daemon=True).start()
         
         return jsonify({
             'status': 'success',
-            'message': 'Visualization cache cleared successfully'
-        })
+            'domain': domain,
+            'generation': generation,
+            'message': f'Cache domain {domain} invalidated'
+        }), 202
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Error clearing cache: {str(e)}'
         }), 500
 
+@app.route('/api/clear-visualization-cache', methods=['POST'])
+def clear_visualization_cache():
+    """Admin endpoint to clear all visualization caches"""
+    return invalidate_cache('visualizations')
+
 
 if __name__ == '__main__':
+    # Development server: load shared state in-process (gunicorn does this
+    # in gunicorn.conf.py before forking workers)
+    load_shared_state()
     app.run(
         host=os.getenv('FLASK_HOST', '0.0.0.0'),
         port=int(os.getenv('FLASK_PORT', 5000)),
@@ -1,9 +1,15 @@
-from flask import Flask, request, render_template, jsonify, send_file
+from flask import Flask, request, render_template, jsonify, send_from_directory, url_for, abort
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
 import os
-import io
 import json
+import threading
+import time
+import mimetypes
 from dotenv import load_dotenv
+from compression import compress_response, choose_encoding
 
 # Load environment variables
 load_dotenv()
@@ -13,17 +19,186 @@ app = Flask(__name__)
 # Configure application
 app.config['API_URL'] = os.getenv('API_URL', 'http://localhost:5000/api')
 
-@app.route('/')
-def home():
-    # Check if the API is ready by pinging the status endpoint
+# Timeouts (seconds) for calls to the API: connecting, then waiting for data.
+# Rendering a visualization that is not cached yet can take longer.
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', 1))
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', 10))
+API_RENDER_TIMEOUT = float(os.getenv('API_RENDER_TIMEOUT', 30))
+
+# One keep-alive connection pool to the API shared by all request threads
+api_session = requests.Session()
+_api_adapter = HTTPAdapter(pool_maxsize=int(os.getenv('API_POOL_SIZE', 20)))
+api_session.mount('http://', _api_adapter)
+api_session.mount('https://', _api_adapter)
+
+# Request headers passed to the API, and response headers passed back
+FORWARDED_REQUEST_HEADERS = ('If-None-Match', 'If-Modified-Since')
+FORWARDED_RESPONSE_HEADERS = (
+    'Content-Type', 'Content-Length', 'Content-Encoding', 'Cache-Control', 'ETag',
+    'Last-Modified', 'Expires', 'Vary', 'Retry-After', 'Server-Timing'
+)
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+def proxy(method, path, read_timeout=API_READ_TIMEOUT, **kwargs):
+    """Forward the current request to the API and stream its response back
+    
+    The body is relayed chunk by chunk as it arrives (still encoded, so
+    Content-Length and Content-Encoding stay valid) and the upstream
+    connection goes back to the pool when the body is done.
+    """
+    headers = {name: request.headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+    # Only ask for an encoding the browser accepts, since the body is not decoded here
+    headers['Accept-Encoding'] = request.headers.get('Accept-Encoding', 'identity')
+    upstream = api_session.request(
+        method, f"{app.config['API_URL']}{path}", headers=headers, stream=True,
+        timeout=(API_CONNECT_TIMEOUT, read_timeout), **kwargs
+    )
+    
+    def body():
+        try:
+            yield from upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+        finally:
+            upstream.close()
+    
+    response_headers = {name: upstream.headers[name] for name in FORWARDED_RESPONSE_HEADERS
+                        if name in upstream.headers}
+    return app.response_class(body(), status=upstream.status_code, headers=response_headers)
+
+# Fingerprinted, precompressed copies of the static assets written by
+# build_static.py. Their names change with their content, so browsers may
+# cache them forever; without a build the plain static files are used.
+STATIC_DIST_DIR = os.path.join(app.static_folder, 'dist')
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+def load_static_manifest():
+    try:
+        with open(os.path.join(STATIC_DIST_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+static_manifest = load_static_manifest()
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static asset: the fingerprinted build if there is one"""
+    if filename in static_manifest:
+        return url_for('serve_asset', filename=static_manifest[filename])
+    return url_for('static', filename=filename)
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted asset, precompressed if the browser accepts it"""
+    if filename not in static_manifest.values():
+        abort(404)
+    
+    available = {coding for coding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                 if os.path.exists(os.path.join(STATIC_DIST_DIR, filename + suffix))}
+    coding = choose_encoding(request.headers.get('Accept-Encoding'), available)
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(coding, '')
+    
+    response = send_from_directory(STATIC_DIST_DIR, filename + suffix,
+                                   mimetype=mimetypes.guess_type(filename)[0], max_age=ASSET_MAX_AGE)
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+@app.after_request
+def compress(response):
+    """gzip/brotli the page and gateway JSON (proxied responses arrive already encoded)"""
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+# The page gateway runs its API calls concurrently on one event loop in a
+# background thread, with a long-lived async client (and its connection pool)
+VISUALIZATION_TYPES = ('similarity_chart', 'wordcloud')
+_gateway = {'loop': None, 'client': None}
+_gateway_lock = threading.Lock()
+
+def gateway_loop():
+    """Return the gateway's event loop, starting it (and its client) on first use"""
+    with _gateway_lock:
+        if _gateway['loop'] is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True).start()
+            
+            async def make_client():
+                pool_size = int(os.getenv('API_POOL_SIZE', 20))
+                return httpx.AsyncClient(
+                    base_url=app.config['API_URL'],
+                    timeout=httpx.Timeout(API_READ_TIMEOUT, connect=API_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                )
+            _gateway['client'] = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+            _gateway['loop'] = loop
+        return _gateway['loop']
+
+async def fetch_page(movie_id, params):
+    """Fetch recommendations while asking the API to prepare both visualizations
+    
+    Returns (status code, payload). Visualizations that could not be
+    prepared still get a URL; the image request will render them.
+    """
+    client = _gateway['client']
+    recommendations, *prepared = await asyncio.gather(
+        client.get(f'/recommendations/{movie_id}', params=params),
+        *(client.post(f'/visualization/{viz_type}/{movie_id}') for viz_type in VISUALIZATION_TYPES),
+        return_exceptions=True
+    )
+    if isinstance(recommendations, Exception):
+        raise recommendations
+    
+    payload = recommendations.json()
+    if recommendations.status_code == 200:
+        payload['visualizations'] = {
+            viz_type: {
+                'url': f'/api/visualization/{viz_type}/{movie_id}',
+                'ready': not isinstance(response, Exception) and response.status_code == 200
+            }
+            for viz_type, response in zip(VISUALIZATION_TYPES, prepared)
+        }
+    return recommendations.status_code, payload
+
+# API readiness as last seen by the background probe (None until the first probe)
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', 10))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 2))
+api_health = {'ready': None, 'checked_at': None}
+_health_probe_lock = threading.Lock()
+_health_probe = {'thread': None}
+
+def probe_api():
+    """Check the API's readiness endpoint once and record the result"""
     try:
-        response = requests.get(f"{app.config['API_URL']}/status", timeout=5)
-        if response.status_code == 200 and response.json().get('status') == 'ok':
-            api_ready = True
-        else:
-            api_ready = False
+        response = api_session.get(f"{app.config['API_URL']}/status",
+                                   timeout=(API_CONNECT_TIMEOUT, HEALTH_PROBE_TIMEOUT))
+        ready = response.status_code == 200 and response.json().get('status') == 'ok'
     except Exception:
-        api_ready = False
+        ready = False
+    if ready != api_health['ready']:
+        app.logger.info(f"API is {'ready' if ready else 'unavailable'}")
+    api_health['ready'] = ready
+    api_health['checked_at'] = time.time()
+
+def _run_health_probe():
+    while True:
+        probe_api()
+        time.sleep(HEALTH_PROBE_INTERVAL)
+
+def start_health_probe():
+    """Start the background probe in this process (once)"""
+    with _health_probe_lock:
+        if _health_probe['thread'] is None:
+            _health_probe['thread'] = threading.Thread(target=_run_health_probe, daemon=True)
+            _health_probe['thread'].start()
+
+@app.route('/')
+def home():
+    # Readiness comes from the background probe; rendering never waits on the API.
+    # Until the first probe finishes the API is assumed ready rather than flagged.
+    start_health_probe()
+    api_ready = api_health['ready'] is not False
     
     # Render the search page
     return render_template('index.html', api_ready=api_ready)
@@ -35,13 +210,7 @@ def search():
     
     try:
         # Forward the request to the API
-        response = requests.post(
-            f"{app.config['API_URL']}/search",
-            data={'movie_title': movie_title}
-        )
-        
-        # Make sure we're returning the raw JSON
-        return response.text, response.status_code, {'Content-Type': 'application/json'}
+        return proxy('POST', '/search', data={'movie_title': movie_title})
     except Exception as e:
         app.logger.error(f"Error searching for movie: {e}")
         return jsonify({
@@ -49,18 +218,24 @@ def search():
             'message': f'Error contacting recommendation service: {str(e)}'
         }), 500
 
+@app.route('/api/autocomplete', methods=['GET'])
+def autocomplete():
+    """Proxy the autocomplete request to the API"""
+    try:
+        return proxy('GET', '/autocomplete', read_timeout=2, params=request.args)
+    except Exception as e:
+        app.logger.error(f"Error getting autocomplete suggestions: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Error contacting recommendation service: {str(e)}'
+        }), 500
+
 @app.route('/api/recommendations/<int:movie_id>', methods=['GET'])
 def get_recommendations(movie_id):
     """Proxy the recommendations request to the API"""
     try:
         # Forward the request to the API
-        response = requests.get(
-            f"{app.config['API_URL']}/recommendations/{movie_id}",
-            params=request.args
-        )
-        
-        # Return the raw JSON
-        return response.text, response.status_code, {'Content-Type': 'application/json'}
+        return proxy('GET', f'/recommendations/{movie_id}', params=request.args)
     except Exception as e:
         app.logger.error(f"Error getting recommendations: {e}")
         return jsonify({
@@ -68,30 +243,31 @@ def get_recommendations(movie_id):
             'message': f'Error contacting recommendation service: {str(e)}'
         }), 500
         
+@app.route('/api/page/<int:movie_id>', methods=['GET'])
+def get_page(movie_id):
+    """Everything the recommendation page needs in one call
+    
+    The API's recommendations response, plus visualizations: the URL of each
+    image and whether it is already cached (the API renders the others in
+    the background while the page is being built).
+    """
+    try:
+        future = asyncio.run_coroutine_threadsafe(fetch_page(movie_id, dict(request.args)), gateway_loop())
+        status_code, payload = future.result(timeout=API_CONNECT_TIMEOUT + API_READ_TIMEOUT)
+        return jsonify(payload), status_code
+    except Exception as e:
+        app.logger.error(f"Error building recommendation page: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Error contacting recommendation service: {str(e)}'
+        }), 500
+
 @app.route('/api/visualization/<string:viz_type>/<int:movie_id>', methods=['GET'])
 def get_visualization(viz_type, movie_id):
     """Proxy the visualization request to the API"""
     try:
-        # Forward the request to the API
-        response = requests.get(
-            f"{app.config['API_URL']}/visualization/{viz_type}/{movie_id}",
-            stream=True
-        )
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            return jsonify({
-                'status': 'error',
-                'message': f'Error retrieving visualization: {response.text}'
-            }), response.status_code
-        
-        # Return the image
-        return send_file(
-            io.BytesIO(response.content),
-            mimetype='image/png',
-            as_attachment=False,
-            download_name=f'{viz_type}_{movie_id}.png'
-        )
+        # Stream the image (or the API's JSON error) straight through
+        return proxy('GET', f'/visualization/{viz_type}/{movie_id}', read_timeout=API_RENDER_TIMEOUT)
     except Exception as e:
         app.logger.error(f"Error getting visualization: {e}")
         return jsonify({
@@ -100,6 +276,7 @@ def get_visualization(viz_type, movie_id):
         }), 500
 
 if __name__ == '__main__':
+    start_health_probe()
     app.run(
         host=os.getenv('FLASK_HOST', '0.0.0.0'),
         port=int(os.getenv('WEBAPP_PORT', 8080)),
@@ -0,0 +1,91 @@
+"""Compare the RedisCache codecs with plain pickle: encode/decode time and bytes per key
+
+Needs no Redis; values are synthetic but shaped like the real cache entries.
+
+    python -m benchmarks.bench_cache_codec --output codec.json
+"""
+import argparse
+import os
+import pickle
+import random
+from datetime import datetime
+
+import cache_utils
+from cache_utils import encode_value, decode_value
+from benchmarks.common import summarize, time_call, write_json
+
+WORDS = ('love war family city secret young police world life story man woman journey '
+         'team death dream escape mission friend past town night battle truth').split()
+
+
+def make_movie(rng, movie_id, with_overview):
+    """A row shaped like a movies table projection"""
+    movie = {
+        'movie_id': movie_id,
+        'title': ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4))),
+        'release_date': datetime(rng.randint(1950, 2017), rng.randint(1, 12), rng.randint(1, 28)),
+        'vote_average': round(rng.uniform(3, 9), 1),
+        'genres': [{'id': g, 'name': f'Genre{g}'} for g in rng.sample(range(20), rng.randint(1, 3))],
+        'similarity_score': rng.random()
+    }
+    if with_overview:
+        movie['overview'] = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 80)))
+        movie['budget'] = float(rng.randint(0, 200) * 1e6)
+        movie['revenue'] = float(rng.randint(0, 900) * 1e6)
+    return movie
+
+
+def make_values(seed=42):
+    rng = random.Random(seed)
+    return {
+        'recommendations (summary x10)': [make_movie(rng, i, False) for i in range(10)],
+        'recommendations (full x10)': [make_movie(rng, i, True) for i in range(10)],
+        'search result (x10)': {
+            'status': 'success', 'exact_match': False, 'next_cursor': None,
+            'similar_movies': [make_movie(rng, i, False) for i in range(10)]
+        },
+        # PNGs are already deflate-compressed, so random bytes are a fair stand-in
+        'visualization png (80KB)': os.urandom(80 * 1024)
+    }
+
+
+def measure(encode, decode, value, rounds):
+    encode_ms, decode_ms = [], []
+    data = encode(value)
+    for _ in range(rounds):
+        data, elapsed = time_call(encode, value)
+        encode_ms.append(elapsed)
+        _, elapsed = time_call(decode, data)
+        decode_ms.append(elapsed)
+    return {
+        'bytes': len(data),
+        'encode_us_p50': summarize(encode_ms)['p50_ms'] * 1000,
+        'decode_us_p50': summarize(decode_ms)['p50_ms'] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    print(f"Compression: {cache_utils.COMPRESSION} (0 none, 1 zlib, 2 zstd, 3 lz4), "
+          f"threshold {cache_utils.COMPRESS_MIN_BYTES} bytes")
+    print(f"{'value':<32}{'format':<8}{'bytes':>9}{'encode us':>12}{'decode us':>12}")
+
+    results = {}
+    for name, value in make_values().items():
+        results[name] = {
+            'pickle': measure(pickle.dumps, pickle.loads, value, args.rounds),
+            'codec': measure(encode_value, decode_value, value, args.rounds)
+        }
+        for fmt, row in results[name].items():
+            print(f"{name:<32}{fmt:<8}{row['bytes']:>9}{row['encode_us_p50']:>12.1f}{row['decode_us_p50']:>12.1f}")
+
+    if args.output:
+        write_json(args.output, {'compression': cache_utils.COMPRESSION, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
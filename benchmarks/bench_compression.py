@@ -0,0 +1,73 @@
+"""Response sizes before and after compression for typical API pages
+
+Requests search pages, recommendation lists, batch recommendations and
+the metrics page from the API in this process (synthetic catalog, in-process
+fakes) with and without Accept-Encoding, and reports the bytes on the wire
+and the time spent compressing.
+
+    python -m benchmarks.bench_compression --size 10000 --output compression.json
+"""
+import argparse
+import random
+
+from benchmarks.fakes import FakeCatalog, install
+from benchmarks.common import summarize, time_call, write_json
+
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def pages(catalog, rng, samples):
+    """Yield (page name, path) for a sample of typical requests"""
+    movies = list(catalog.movies.values())
+    for _ in range(samples):
+        movie = rng.choice(movies)
+        word = rng.choice(movie['title'].split())
+        yield 'search', f"/api/search?q={word}&limit=20"
+        yield 'autocomplete', f"/api/autocomplete?q={word[:3]}"
+        yield 'recommendations', f"/api/recommendations/{movie['movie_id']}?limit=10"
+        ids = ','.join(str(rng.choice(movies)['movie_id']) for _ in range(3))
+        yield 'multi', f"/api/recommendations?ids={ids}"
+    yield 'metrics', "/api/metrics"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000, help='Synthetic catalog size')
+    parser.add_argument('--samples', type=int, default=50, help='Requests per page type')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    import api
+    print(f"Generating a catalog of {args.size} movies...")
+    catalog = FakeCatalog.synthetic(args.size)
+    install(api, catalog)
+    client = api.app.test_client()
+
+    sizes = {}
+    latency = {}
+    for name, path in pages(catalog, random.Random(42), args.samples):
+        for encoding in ENCODINGS:
+            response, elapsed = time_call(client.get, path, headers={'Accept-Encoding': encoding})
+            if response.status_code != 200:
+                continue
+            actual = response.headers.get('Content-Encoding', 'identity')
+            totals = sizes.setdefault(name, {}).setdefault(actual, [0, 0])
+            totals[0] += len(response.get_data())
+            totals[1] += 1
+            latency.setdefault(f'{name}/{actual}', []).append(elapsed)
+
+    results = {}
+    print(f"{'page':<18}{'identity':>12}{'gzip':>12}{'br':>12}  (mean bytes)")
+    for name, by_encoding in sizes.items():
+        means = {encoding: total / count for encoding, (total, count) in by_encoding.items()}
+        results[name] = {'bytes': means, 'latency': {encoding: summarize(latency[f'{name}/{encoding}'])
+                                                     for encoding in by_encoding}}
+        print(f"{name:<18}" + ''.join(f"{means[encoding]:>12.0f}" if encoding in means else f"{'-':>12}"
+                                      for encoding in ENCODINGS))
+
+    if args.output:
+        write_json(args.output, {'benchmark': 'compression', 'catalog_size': args.size, 'pages': results})
+
+
+if __name__ == '__main__':
+    main()
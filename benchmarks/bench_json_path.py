@@ -0,0 +1,90 @@
+"""Compare response building: RealDictCursor rows + Flask JSON vs JSON built by Postgres
+
+Times the query plus serialization to a response body for search pages and
+recommendation lists, against the database configured in .env.
+
+    python -m benchmarks.bench_json_path --samples 200 --limit 50 --output json_path.json
+"""
+import argparse
+import random
+
+from flask import Flask
+
+from db_utils import Database, MOVIE_FIELDS, MOVIE_SUMMARY_FIELDS
+from benchmarks.common import summarize, time_call, print_table, write_json
+
+# Serializes like the API's jsonify()
+app = Flask(__name__)
+
+
+def python_search(db, query, limit, fields):
+    rows = db.search_movies_by_title(query, limit, fields)
+    for row in rows:
+        del row['rank_popularity']
+    return app.json.dumps({'similar_movies': rows}).encode('utf-8')
+
+
+def postgres_search(db, query, limit, fields):
+    page = db.search_movies_by_title_json(query, limit, fields)
+    return ('{"similar_movies": ' + page['data'] + '}').encode('utf-8')
+
+
+def python_recommendations(db, movie_id, limit, fields):
+    rows = db.get_similar_movies(movie_id, limit, fields)
+    return app.json.dumps({'recommendations': rows}).encode('utf-8')
+
+
+def postgres_recommendations(db, movie_id, limit, fields):
+    page = db.get_similar_movies_json(movie_id, limit, fields)
+    return ('{"recommendations": ' + page['data'] + '}').encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    with Database() as db:
+        db.execute("SELECT movie_id, title FROM movies")
+        movies = db.fetchall()
+        if not movies:
+            print("No movies found in database. Run import_movies.py first.")
+            return
+
+        rng = random.Random(42)
+        # Short title words match many movies, so search pages fill up
+        words = [word for movie in movies for word in movie['title'].lower().split() if len(word) >= 4]
+        queries = [rng.choice(words) for _ in range(args.samples)]
+        movie_ids = [rng.choice(movies)['movie_id'] for _ in range(args.samples)]
+        print(f"Benchmarking {args.samples} samples of up to {args.limit} rows...")
+
+        cases = {
+            'search/summary': (queries, MOVIE_SUMMARY_FIELDS, python_search, postgres_search),
+            'search/all_fields': (queries, MOVIE_FIELDS, python_search, postgres_search),
+            'recs/summary': (movie_ids, MOVIE_SUMMARY_FIELDS, python_recommendations, postgres_recommendations),
+            'recs/all_fields': (movie_ids, MOVIE_FIELDS, python_recommendations, postgres_recommendations)
+        }
+
+        samples = {}
+        body_bytes = {}
+        for case, (inputs, fields, python_path, postgres_path) in cases.items():
+            for path_name, run in (('python', python_path), ('postgres', postgres_path)):
+                name = f'{case}/{path_name}'
+                run(db, inputs[0], args.limit, fields)  # Warm up
+                for value in inputs:
+                    body, elapsed = time_call(run, db, value, args.limit, fields)
+                    samples.setdefault(name, []).append(elapsed)
+                    body_bytes[name] = body_bytes.get(name, 0) + len(body)
+
+    results = {name: summarize(values) for name, values in samples.items()}
+    print_table(results)
+
+    if args.output:
+        write_json(args.output, {'catalog_size': len(movies), 'limit': args.limit,
+                                 'latency': results, 'body_bytes': body_bytes})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Micro-benchmarks of the CPU-bound stages on a synthetic catalog
+
+Times calculate_evaluation_metrics, both visualization renderers, the
+embedding engine and the import's similarity stage (cosine similarity of a
+batch plus candidate pool selection), with no database or Redis.
+
+    python -m benchmarks.bench_micro --size 100000 --output micro.json
+"""
+import argparse
+import random
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+import api
+from import_movies import candidate_pool
+from benchmarks.fakes import FakeCatalog, FakeDatabase
+from benchmarks.common import summarize, time_call, print_table, write_json
+
+
+def bench_metrics(db, movie_ids, depth):
+    samples = []
+    for movie_id in movie_ids:
+        source = db.get_movie_by_id(movie_id, api.METRICS_FIELDS)
+        recommendations = db.get_similar_movies(movie_id, depth, api.METRICS_FIELDS)
+        samples.append(time_call(api.calculate_evaluation_metrics, source, recommendations)[1])
+    return samples
+
+
+def bench_render(db, movie_ids, render):
+    samples = []
+    for movie_id in movie_ids:
+        movie = db.get_movie_by_id(movie_id, api.VISUALIZATION_FIELDS)
+        recommendations = db.get_similar_movies(movie_id, 5, api.VISUALIZATION_FIELDS)
+        samples.append(time_call(render, movie, recommendations)[1])
+    return samples
+
+
+def bench_embedding(catalog, movie_ids, method, seeds):
+    rng = random.Random(7)
+    all_ids = sorted(catalog.movies)
+    samples = []
+    for movie_id in movie_ids:
+        seed_ids = [movie_id] + rng.sample(all_ids, seeds - 1)
+        samples.append(time_call(catalog.engine.recommend, seed_ids, 10, method=method)[1])
+    return samples
+
+
+def bench_similarity_stage(size, features, batches, batch_size=100):
+    """Time import batches of cosine_similarity + candidate_pool over size x features"""
+    rng = np.random.default_rng(42)
+    reduced = rng.standard_normal((size, features))
+    samples = []
+    for _ in range(batches):
+        start = rng.integers(0, size - batch_size)
+
+        def run():
+            similarities = cosine_similarity(reduced[start:start + batch_size], reduced)
+            for idx, row in enumerate(similarities):
+                candidate_pool(row, start + idx)
+        samples.append(time_call(run)[1])
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000, help='Catalog size (e.g. 10000 to 500000)')
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--render-samples', type=int, default=10)
+    parser.add_argument('--features', type=int, default=1000,
+                        help='Feature width for the similarity stage (the import reduces to 5000; '
+                             'size x features float64 values are held in memory)')
+    parser.add_argument('--batches', type=int, default=5, help='Similarity batches of 100 movies to time')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    print(f"Generating a catalog of {args.size} movies...")
+    catalog = FakeCatalog.synthetic(args.size)
+    FakeDatabase.catalog = catalog
+    rng = random.Random(42)
+    movie_ids = [rng.randrange(1, args.size + 1) for _ in range(args.samples)]
+
+    samples = {}
+    with FakeDatabase() as db:
+        print("Timing metrics, renders and the embedding engine...")
+        for depth in (10, 100):
+            samples[f'metrics/{depth}'] = bench_metrics(db, movie_ids, depth)
+        api.warm_up_renderer()
+        samples['render/similarity_chart'] = bench_render(db, movie_ids[:args.render_samples],
+                                                         api.generate_similarity_chart)
+        samples['render/wordcloud'] = bench_render(db, movie_ids[:args.render_samples], api.generate_wordcloud)
+    for method in ('centroid', 'fusion'):
+        samples[f'embedding/{method}'] = bench_embedding(catalog, movie_ids, method, 3)
+
+    print(f"Timing {args.batches} similarity batches over {args.size} x {args.features} features...")
+    samples['similarity/batch_100'] = bench_similarity_stage(args.size, args.features, args.batches)
+
+    results = {name: summarize(values) for name, values in samples.items()}
+    print_table(results)
+    estimated_s = results['similarity/batch_100']['mean_ms'] * args.size / 100 / 1000
+    print(f"Estimated similarity stage for the whole catalog (without inserts): {estimated_s:.0f}s")
+
+    if args.output:
+        write_json(args.output, {'benchmark': 'micro', 'catalog_size': args.size, 'features': args.features,
+                                 'latency': results, 'estimated_similarity_stage_s': estimated_s})
+
+
+if __name__ == '__main__':
+    main()
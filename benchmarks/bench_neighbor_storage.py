@@ -0,0 +1,73 @@
+"""Compare neighbour storage layouts: movie_similarities rows vs movie_neighbors arrays
+
+Needs both tables filled: import with the default NEIGHBOR_STORAGE=rows, then
+run migrations/001_movie_neighbors.sql.
+
+    python -m benchmarks.bench_neighbor_storage --lookups 500 --output neighbors.json
+"""
+import argparse
+import random
+
+from db_utils import Database
+from benchmarks.common import summarize, time_call, print_table, write_json
+
+TABLES = {'rows': 'movie_similarities', 'arrays': 'movie_neighbors'}
+
+
+def table_sizes(db, table):
+    """Row count and on-disk bytes of a table, its indexes and everything together"""
+    db.execute(f"""
+        SELECT (SELECT COUNT(*) FROM {table}) AS row_count,
+               pg_relation_size('{table}') AS table_bytes,
+               pg_indexes_size('{table}') AS index_bytes,
+               pg_total_relation_size('{table}') AS total_bytes
+    """)
+    return dict(db.fetchone())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lookups', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    with Database() as db:
+        db.execute("""
+            SELECT mn.source_movie_id FROM movie_neighbors mn
+            WHERE EXISTS (SELECT 1 FROM movie_similarities ms WHERE ms.source_movie_id = mn.source_movie_id)
+        """)
+        movie_ids = [row['source_movie_id'] for row in db.fetchall()]
+        if not movie_ids:
+            print("No movies found in both layouts. Import, then run migrations/001_movie_neighbors.sql.")
+            return
+
+        sizes = {storage: table_sizes(db, table) for storage, table in TABLES.items()}
+        print(f"{'layout':<10}{'rows':>12}{'table MB':>12}{'index MB':>12}{'total MB':>12}")
+        for storage, size in sizes.items():
+            print(f"{storage:<10}{size['row_count']:>12}{size['table_bytes'] / 2**20:>12.1f}"
+                  f"{size['index_bytes'] / 2**20:>12.1f}{size['total_bytes'] / 2**20:>12.1f}")
+
+        rng = random.Random(42)
+        sample = [rng.choice(movie_ids) for _ in range(args.lookups)]
+        print(f"Benchmarking {len(sample)} lookups of {args.limit} neighbours...")
+
+        # Warm both layouts so the first sample does not include cold caches
+        for storage in TABLES:
+            db.get_similar_movies(sample[0], args.limit, storage=storage)
+
+        samples = {}
+        for storage in TABLES:
+            for movie_id in sample:
+                _, elapsed = time_call(db.get_similar_movies, movie_id, args.limit, storage=storage)
+                samples.setdefault(storage, []).append(elapsed)
+
+    results = {name: summarize(values) for name, values in samples.items()}
+    print_table(results)
+
+    if args.output:
+        write_json(args.output, {'sizes': sizes, 'latency': results, 'limit': args.limit})
+
+
+if __name__ == '__main__':
+    main()
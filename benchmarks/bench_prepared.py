@@ -0,0 +1,90 @@
+"""Measure the planning time saved by running the hot queries as prepared statements
+
+For each query, compares EXPLAIN ANALYZE of the plain statement against
+EXPLAIN ANALYZE EXECUTE of a prepared one on the same connection, and times
+both from the client. Runs against the database configured in .env.
+
+    python -m benchmarks.bench_prepared --samples 200 --output prepared.json
+"""
+import argparse
+import random
+
+from db_utils import Database, MOVIE_FIELDS, MOVIE_SUMMARY_FIELDS, movie_columns, to_server_placeholders
+from benchmarks.common import summarize, time_call, print_table, write_json
+
+
+def hot_queries(db, movie, viz_type='similarity_chart'):
+    """(name, query, params) for each hot query, as Database runs them"""
+    return [
+        ('movie_by_id', f"SELECT {movie_columns(MOVIE_FIELDS)} FROM movies m WHERE m.movie_id = %s",
+         (movie['movie_id'],)),
+        ('exact_title', f"SELECT {movie_columns(MOVIE_FIELDS)} FROM movies m WHERE LOWER(m.title) = LOWER(%s)",
+         (movie['title'],)),
+        ('similar_movies', *db._similar_movies_query(movie['movie_id'], 10, MOVIE_SUMMARY_FIELDS, None, None)),
+        ('title_search', *db._search_query(movie['title'][:6], 10, MOVIE_SUMMARY_FIELDS, None)),
+        ('visualization', "SELECT image_data, created_at FROM visualizations "
+                          "WHERE movie_id = %s AND visualization_type = %s", (movie['movie_id'], viz_type))
+    ]
+
+
+def explain(db, query, params):
+    """Return (planning ms, execution ms) from EXPLAIN ANALYZE"""
+    db.cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", params)
+    plan = list(db.cursor.fetchone().values())[0][0]
+    return plan['Planning Time'], plan['Execution Time']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    with Database() as db:
+        db.execute("SELECT movie_id, title FROM movies")
+        movies = db.fetchall()
+        if not movies:
+            print("No movies found in database. Run import_movies.py first.")
+            return
+
+        rng = random.Random(42)
+        sample = [rng.choice(movies) for _ in range(args.samples)]
+        print(f"Benchmarking {args.samples} samples of {len(hot_queries(db, sample[0]))} queries...")
+
+        planning = {}
+        latency = {}
+        prepared = set()
+        for movie in sample:
+            for name, query, params in hot_queries(db, movie):
+                statement, ordered = to_server_placeholders(query, params)
+                if name not in prepared:
+                    db.cursor.execute(f"PREPARE bench_{name} AS {statement}")
+                    prepared.add(name)
+                execute = f"EXECUTE bench_{name} ({', '.join(['%s'] * len(ordered))})"
+
+                for path, (sql, values) in (('plain', (query, params)), ('prepared', (execute, ordered))):
+                    plan_ms, exec_ms = explain(db, sql, values)
+                    planning.setdefault(f'{name}/{path}', []).append(plan_ms)
+                    _, elapsed = time_call(db.cursor.execute, sql, values)
+                    db.cursor.fetchall()
+                    latency.setdefault(f'{name}/{path}', []).append(elapsed)
+        db.conn.rollback()
+
+    planning_results = {name: summarize(values) for name, values in planning.items()}
+    latency_results = {name: summarize(values) for name, values in latency.items()}
+    print("Server planning time")
+    print_table(planning_results)
+    print("Client round trip")
+    print_table(latency_results)
+
+    saved = {}
+    for name in {key.split('/')[0] for key in planning}:
+        saved[name] = planning_results[f'{name}/plain']['mean_ms'] - planning_results[f'{name}/prepared']['mean_ms']
+    print("Mean planning time saved per execution (ms):", {name: round(ms, 3) for name, ms in sorted(saved.items())})
+
+    if args.output:
+        write_json(args.output, {'planning': planning_results, 'latency': latency_results, 'saved_ms': saved})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare title search latency: legacy LIKE scan vs trigram-indexed search
+
+Runs against the database configured in .env, so point it at a full import.
+
+    python -m benchmarks.bench_search --queries 300 --output search.json
+"""
+import argparse
+import random
+
+from db_utils import Database
+from benchmarks.common import summarize, time_call, print_table, write_json
+
+
+def make_queries(titles, count, seed=42):
+    """Build a mix of substring, misspelled and missing queries from real titles"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        title = rng.choice(titles).lower()
+        kind = rng.random()
+        if kind < 0.4 and len(title) > 6:
+            # Substring from the middle of a title
+            start = rng.randint(0, len(title) // 2)
+            queries.append(('substring', title[start:start + rng.randint(4, 10)]))
+        elif kind < 0.8 and len(title) > 4:
+            # Drop one character to simulate a typo
+            pos = rng.randint(1, len(title) - 2)
+            queries.append(('typo', title[:pos] + title[pos + 1:]))
+        else:
+            queries.append(('miss', ''.join(rng.choice('qxzjkv') for _ in range(8))))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    with Database() as db:
+        db.execute("SELECT title FROM movies")
+        titles = [row['title'] for row in db.fetchall() if row['title']]
+        if not titles:
+            print("No movies found in database. Run import_movies.py first.")
+            return
+        print(f"Benchmarking {args.queries} queries against {len(titles)} movies...")
+
+        queries = make_queries(titles, args.queries)
+        paths = {
+            'like': lambda q: db.get_movies_by_partial_title(q, args.limit),
+            'trigram': lambda q: db.search_movies_by_title(q, args.limit)
+        }
+
+        # Warm both paths so the first sample does not include cold caches
+        for run in paths.values():
+            run(queries[0][1])
+
+        samples = {}
+        hits = {}
+        for name, run in paths.items():
+            for kind, q in queries:
+                rows, elapsed = time_call(run, q)
+                samples.setdefault(f'{name}/all', []).append(elapsed)
+                samples.setdefault(f'{name}/{kind}', []).append(elapsed)
+                hits.setdefault(f'{name}/{kind}', 0)
+                hits[f'{name}/{kind}'] += 1 if rows else 0
+
+    results = {name: summarize(values) for name, values in sorted(samples.items())}
+    print_table(results)
+    print("Queries returning results:", hits)
+
+    if args.output:
+        write_json(args.output, {'catalog_size': len(titles), 'latency': results, 'hits': hits})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Shared helpers for the benchmark scripts"""
+import json
+import time
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile (0-100) of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    """Summarize a list of latencies in milliseconds"""
+    return {
+        'count': len(samples_ms),
+        'mean_ms': sum(samples_ms) / len(samples_ms) if samples_ms else 0.0,
+        'p50_ms': percentile(samples_ms, 50),
+        'p95_ms': percentile(samples_ms, 95),
+        'p99_ms': percentile(samples_ms, 99),
+        'max_ms': max(samples_ms) if samples_ms else 0.0
+    }
+
+
+def time_call(func, *args, **kwargs):
+    """Call func and return (result, elapsed milliseconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def print_table(results):
+    """Print {name: summary} as an aligned table"""
+    print(f"{'case':<28}{'n':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for name, summary in results.items():
+        print(f"{name:<28}{summary['count']:>7}{summary['mean_ms']:>10.2f}"
+              f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+
+
+def write_json(path, payload):
+    """Write benchmark results to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, default=str)
+    print(f"Results written to {path}")
@@ -0,0 +1,64 @@
+"""Compare two benchmark result files written with --output
+
+Matches every latency summary by name and prints the change in each
+percentile (and throughput, for load runs). Exits with status 1 when a
+p50/p95/p99 got slower, or throughput lower, by more than --threshold percent.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+def summaries(payload, prefix=''):
+    """Yield (name, summary) for every latency summary nested in a result file"""
+    if isinstance(payload, dict):
+        if 'p50_ms' in payload:
+            yield prefix, payload
+            return
+        for key, value in payload.items():
+            yield from summaries(value, f'{prefix}/{key}' if prefix else key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = dict(summaries(json.load(f)))
+    with open(args.candidate) as f:
+        candidate = dict(summaries(json.load(f)))
+
+    regressions = []
+    print(f"{'case':<40}{'metric':>16}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for name in baseline:
+        if name not in candidate:
+            print(f"{name:<40}{'(missing in candidate)':>50}")
+            continue
+        for metric in METRICS:
+            if metric not in baseline[name] or metric not in candidate[name]:
+                continue
+            before, after = baseline[name][metric], candidate[name][metric]
+            change = (after - before) / before * 100 if before else 0.0
+            # Latency regresses upwards, throughput downwards
+            worse = -change if metric == 'throughput_rps' else change
+            flag = '  !' if worse > args.threshold else ''
+            if flag:
+                regressions.append((name, metric))
+            print(f"{name:<40}{metric:>16}{before:>12.2f}{after:>12.2f}{change:>+9.1f}%{flag}")
+    for name in candidate.keys() - baseline.keys():
+        print(f"{name:<40}{'(new in candidate)':>50}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""In-process stand-ins for Postgres and Redis, for benchmarks without a local stack
+
+FakeRedis implements the commands RedisCache sends; FakeDatabase answers the
+Database methods the API calls from a synthetic catalog held in memory (see
+benchmarks/synthetic.py). Their latencies are not those of the real
+services: use them to compare changes to the Python side (routing, caching,
+serialization, metrics, rendering), and a local stack for anything that
+depends on the queries. db_latency_ms adds a fixed round trip per query.
+
+    from benchmarks import fakes
+    catalog = fakes.FakeCatalog.synthetic(10000)
+    fakes.install(api, catalog)
+"""
+import fnmatch
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from embedding_engine import EmbeddingEngine
+from genre_utils import MAX_GENRES
+from title_index import TITLE_INDEX_QUERY
+from benchmarks.synthetic import generate_movies, generate_embeddings
+
+# Neighbours kept per movie, as import_movies.py stores them
+CANDIDATE_POOL_SIZE = 200
+
+
+class FakeRedis:
+    """A thread-safe dict with expiry that answers like a redis.Redis client"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self._lock = threading.RLock()
+
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    @staticmethod
+    def _bytes(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf-8')
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+    def get(self, key):
+        with self._lock:
+            return self.data[key] if self._live(key) else None
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        with self._lock:
+            if nx and self._live(key):
+                return None
+            self.data[key] = self._bytes(value)
+            self.expires.pop(key, None)
+            if px is not None or ex is not None:
+                self.expires[key] = time.monotonic() + (px / 1000 if px is not None else ex)
+            return True
+
+    def setex(self, key, ttl, value):
+        return self.set(key, value, ex=ttl)
+
+    def pttl(self, key):
+        with self._lock:
+            if not self._live(key):
+                return -2
+            expires = self.expires.get(key)
+            return -1 if expires is None else int((expires - time.monotonic()) * 1000)
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._live(key))
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key):
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    removed += 1
+            return removed
+
+    unlink = delete
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self.get(key) or 0) + 1
+            self.data[key] = self._bytes(value)
+            return value
+
+    def scan(self, cursor=0, match='*', count=None):
+        with self._lock:
+            return 0, [key.encode('utf-8') for key in list(self.data)
+                       if fnmatch.fnmatchcase(key, match) and self._live(key)]
+
+    def eval(self, script, numkeys, *args):
+        # The only script RedisCache runs: delete the lock if we still own it
+        key, token = args[0], args[1]
+        with self._lock:
+            if self.get(key) == self._bytes(token):
+                return self.delete(key)
+            return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client._lock:
+            return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class FakeCatalog:
+    """The movies, genres, embeddings and stored visualizations behind FakeDatabase"""
+
+    def __init__(self, movies, genre_lookup, vectors):
+        self.movies = {movie['movie_id']: movie for movie in movies}
+        self.genre_lookup = genre_lookup
+        # Row i of vectors belongs to the i-th smallest movie id
+        self.engine = EmbeddingEngine(np.array(sorted(self.movies), dtype=np.int64), vectors)
+        self.titles = [(movie['title'].lower(), movie['movie_id']) for movie in movies]
+        self.neighbors = {}
+        self.visualizations = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def synthetic(cls, size, seed=42, dims=256):
+        movies, lookup = generate_movies(size, seed)
+        return cls(movies, lookup, generate_embeddings(size, dims, seed))
+
+    def neighbors_of(self, movie_id):
+        """The stored candidate pool of a movie: (movie_id, score) best first"""
+        pool = self.neighbors.get(movie_id)
+        if pool is None:
+            pool = self.neighbors[movie_id] = self.engine.recommend([movie_id], CANDIDATE_POOL_SIZE)
+        return pool
+
+
+def _matches(movie, filters):
+    """Python version of db_utils.movie_filter_clause"""
+    if filters.get('genres'):
+        names = {genre['name'] for genre in movie['genres']}
+        if not set(filters['genres']) <= names:
+            return False
+    release_date = movie['release_date']
+    if filters.get('year_from') is not None and (release_date is None or release_date.year < filters['year_from']):
+        return False
+    if filters.get('year_to') is not None and (release_date is None or release_date.year > filters['year_to']):
+        return False
+    if filters.get('min_rating') is not None and (movie['vote_average'] is None
+                                                   or movie['vote_average'] < filters['min_rating']):
+        return False
+    if filters.get('exclude') and movie['movie_id'] in filters['exclude']:
+        return False
+    return True
+
+
+class FakeConnection:
+    closed = False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabase:
+    """Answers the Database methods the API uses from FakeDatabase.catalog"""
+
+    catalog = None
+    db_latency_ms = 0.0
+
+    def __init__(self):
+        self.conn = None
+        self.pool = None
+        self._rows = []
+
+    def connect(self):
+        self.conn = FakeConnection()
+        return True
+
+    def disconnect(self):
+        self.conn = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def _round_trip(self):
+        if self.db_latency_ms:
+            time.sleep(self.db_latency_ms / 1000)
+
+    def _row(self, movie, fields):
+        return {field: movie[field] for field in fields}
+
+    def execute(self, query, params=None, commit=False, prepare=False):
+        """Answer the few literal statements the API and its loaders run"""
+        self._round_trip()
+        movies = self.catalog.movies
+        if query.startswith(TITLE_INDEX_QUERY):
+            # Incremental refreshes find nothing new: the catalog does not change
+            self._rows = [] if 'WHERE' in query else [
+                self._row(movie, ('movie_id', 'title', 'release_date', 'popularity', 'updated_at'))
+                for movie in movies.values()]
+        elif 'COUNT(*)' in query and 'FROM movies' in query:
+            self._rows = [{'count': len(movies)}]
+        elif 'FROM genres' in query:
+            self._rows = [{'genre_id': bit, 'name': name} for bit, name in enumerate(self.catalog.genre_lookup)
+                          if bit < MAX_GENRES]
+        elif 'INSERT INTO visualizations' in query:
+            movie_id, viz_type, image_data = params
+            with self.catalog.lock:
+                self.catalog.visualizations[(movie_id, viz_type)] = {
+                    'image_data': bytes(getattr(image_data, 'adapted', image_data)),
+                    'created_at': datetime.now()
+                }
+            self._rows = []
+        elif 'LOCALTIMESTAMP' in query:
+            self._rows = [{'cutoff': datetime.now()}]
+        else:
+            self._rows = [{'?column?': 1}]
+        return True
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def get_movie_by_id(self, movie_id, fields=None):
+        self._round_trip()
+        movie = self.catalog.movies.get(movie_id)
+        return self._row(movie, fields or tuple(movie)) if movie else None
+
+    def get_movies_by_ids(self, movie_ids, fields=None):
+        self._round_trip()
+        movies = self.catalog.movies
+        return [self._row(movies[movie_id], fields or tuple(movies[movie_id]))
+                for movie_id in movie_ids if movie_id in movies]
+
+    def get_movies_by_exact_title(self, title, fields=None):
+        self._round_trip()
+        title = title.lower()
+        return [self._row(self.catalog.movies[movie_id], fields or tuple(self.catalog.movies[movie_id]))
+                for movie_title, movie_id in self.catalog.titles if movie_title == title]
+
+    def search_movies_by_title(self, search_query, limit=10, fields=None, after=None):
+        """Substring matches, title prefixes first, then by popularity (a linear scan)"""
+        self._round_trip()
+        search_query = search_query.lower()
+        ranked = []
+        for title, movie_id in self.catalog.titles:
+            if search_query in title:
+                movie = self.catalog.movies[movie_id]
+                score = 2.0 if title.startswith(search_query) else 1.0
+                position = (score, movie['popularity'] or 0, movie_id)
+                if after is None or position < tuple(after):
+                    ranked.append(position)
+        ranked.sort(reverse=True)
+        rows = []
+        for score, popularity, movie_id in ranked[:limit]:
+            row = self._row(self.catalog.movies[movie_id], fields or tuple(self.catalog.movies[movie_id]))
+            row.update(match_score=score, rank_popularity=popularity)
+            rows.append(row)
+        return rows
+
+    def get_similar_movies(self, movie_id, limit=5, fields=None, filters=None, storage=None):
+        self._round_trip()
+        rows = []
+        for target_id, score in self.catalog.neighbors_of(movie_id):
+            movie = self.catalog.movies[target_id]
+            if filters and not _matches(movie, filters):
+                continue
+            row = self._row(movie, fields or tuple(movie))
+            row['similarity_score'] = score
+            rows.append(row)
+            if len(rows) == limit:
+                break
+        return rows
+
+    def get_movie_ids_matching(self, filters):
+        self._round_trip()
+        return [movie_id for movie_id, movie in self.catalog.movies.items() if _matches(movie, filters)]
+
+    def get_visualization(self, movie_id, viz_type):
+        self._round_trip()
+        return self.catalog.visualizations.get((movie_id, viz_type))
+
+    def delete_visualizations_before(self, cutoff, batch_size=1000):
+        with self.catalog.lock:
+            stale = [key for key, record in self.catalog.visualizations.items() if record['created_at'] < cutoff]
+            for key in stale:
+                del self.catalog.visualizations[key]
+        return len(stale)
+
+
+def install(api, catalog, db_latency_ms=0.0):
+    """Point the API module at catalog and an in-process Redis, then load its shared state
+
+    Returns the FakeRedis. The JSON fast path is turned off since it needs
+    Postgres to build the JSON.
+    """
+    import cache_utils
+
+    FakeDatabase.catalog = catalog
+    FakeDatabase.db_latency_ms = db_latency_ms
+    api.Database = FakeDatabase
+
+    redis_client = FakeRedis()
+
+    def connect(cache):
+        cache.client = redis_client
+        return True
+    cache_utils.RedisCache.connect = connect
+
+    api.app.config['JSON_FAST_PATH'] = False
+    api.load_shared_state()
+    api.shared_state['embeddings'] = catalog.engine
+    return redis_client
@@ -0,0 +1,225 @@
+"""Load generator: throughput and p50/p95/p99 latency per API endpoint
+
+Drives a running API over HTTP, or the Flask app in this process on a
+synthetic catalog with the in-process fakes:
+
+    python -m benchmarks.load --url http://localhost:5000 --concurrency 16 --duration 60 --output load.json
+    python -m benchmarks.load --in-process --size 50000 --db-latency-ms 1 --output load.json
+
+Movies are picked with a popularity skew so caches see a realistic hit
+ratio. --mix sets the relative weight of each endpoint.
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from urllib.parse import quote
+
+from benchmarks.common import summarize, print_table, write_json
+
+DEFAULT_MIX = 'search=3,autocomplete=3,recommendations=4,multi=1,visualization=1'
+
+
+class Workload:
+    """Builds random request paths from a sample of (movie_id, title, popularity)"""
+
+    def __init__(self, movies, seed):
+        self.rng = random.Random(seed)
+        self.movies = movies
+        # Cumulative, so each pick is a binary search rather than a pass over the catalog
+        self.cum_weights = list(itertools.accumulate(max(popularity, 0.01) for _, _, popularity in movies))
+        self.words = sorted({word for _, title, _ in movies for word in title.lower().split() if len(word) >= 3})
+
+    def movie(self):
+        return self.rng.choices(self.movies, cum_weights=self.cum_weights)[0]
+
+    def search(self):
+        if self.rng.random() < 0.3:
+            return f"/api/search?q={quote(self.movie()[1])}"
+        return f"/api/search?q={quote(self.rng.choice(self.words))}"
+
+    def autocomplete(self):
+        word = self.rng.choice(self.movie()[1].split())
+        return f"/api/autocomplete?q={quote(word[:self.rng.randint(1, 4)])}"
+
+    def recommendations(self):
+        movie_id = self.movie()[0]
+        if self.rng.random() < 0.2:
+            return f"/api/recommendations/{movie_id}?limit=5&min_rating=6"
+        return f"/api/recommendations/{movie_id}?limit=5"
+
+    def multi(self):
+        ids = ','.join(str(self.movie()[0]) for _ in range(3))
+        return f"/api/recommendations?ids={ids}&method={self.rng.choice(['centroid', 'fusion'])}"
+
+    def visualization(self):
+        viz_type = self.rng.choice(['similarity_chart', 'wordcloud'])
+        return f"/api/visualization/{viz_type}/{self.movie()[0]}"
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if not hasattr(Workload, name.strip()):
+            raise ValueError(f"Unknown endpoint in --mix: {name}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def http_client(base_url):
+    """Return a function that GETs a path and returns the status code (one session per thread)"""
+    import requests
+
+    local = threading.local()
+
+    def get(path):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        response = session.get(base_url + path, timeout=30)
+        response.content  # Read the whole body, as a browser would
+        return response.status_code
+    return get
+
+
+def in_process_client(size, db_latency_ms):
+    """Set up the API on a synthetic catalog; return (get, movies)"""
+    import api
+    from benchmarks.fakes import FakeCatalog, install
+
+    print(f"Generating a catalog of {size} movies...")
+    catalog = FakeCatalog.synthetic(size)
+    install(api, catalog, db_latency_ms)
+    local = threading.local()
+
+    def get(path):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = api.app.test_client()
+        response = client.get(path)
+        response.get_data()
+        return response.status_code
+
+    movies = [(movie['movie_id'], movie['title'], movie['popularity'] or 0) for movie in catalog.movies.values()]
+    return get, movies
+
+
+def discover_movies(get_json, prefixes='abcdefghijklmnopqrstuvwxyz'):
+    """Collect (movie_id, title, popularity) from a running API through autocomplete"""
+    movies = {}
+    for prefix in prefixes:
+        for result in get_json(f"/api/autocomplete?q={prefix}&limit=20").get('results', []):
+            movies[result['movie_id']] = (result['movie_id'], result['title'], result['popularity'])
+    return list(movies.values())
+
+
+def run(get, movies, mix, concurrency, duration, warmup, seed=42):
+    """Send requests from concurrency threads; return {endpoint: [(status, ms)]} and the elapsed seconds"""
+    results = {name: [] for name in mix}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(worker_id):
+        workload = Workload(movies, seed + worker_id)
+        names, weights = list(mix), list(mix.values())
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            name = workload.rng.choices(names, weights)[0]
+            path = getattr(workload, name)()
+            try:
+                status = get(path)
+            except Exception:
+                status = 'error'
+            elapsed = (time.perf_counter() - now) * 1000
+            if now >= measure_from:
+                with lock:
+                    results[name].append((status, elapsed))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, duration
+
+
+def report(results, elapsed):
+    """Summaries per endpoint (and overall) with throughput and status counts"""
+    endpoints = {}
+    everything = []
+    for name, samples in results.items():
+        latencies = [ms for _, ms in samples]
+        everything.extend(latencies)
+        statuses = {}
+        for status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary = summarize(latencies)
+        summary['throughput_rps'] = len(samples) / elapsed
+        summary['errors'] = sum(count for status, count in statuses.items()
+                                if status == 'error' or int(status) >= 500)
+        summary['statuses'] = statuses
+        endpoints[name] = summary
+    total = summarize(everything)
+    total['throughput_rps'] = len(everything) / elapsed
+    total['errors'] = sum(summary['errors'] for summary in endpoints.values())
+    return endpoints, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running API, e.g. http://localhost:5000')
+    target.add_argument('--in-process', action='store_true', help='Run the app here on a synthetic catalog')
+    parser.add_argument('--size', type=int, default=10000, help='Synthetic catalog size (--in-process)')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                        help='Round trip added to each fake query (--in-process)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of unmeasured requests first')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Endpoint weights (default {DEFAULT_MIX})')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.in_process:
+        get, movies = in_process_client(args.size, args.db_latency_ms)
+    else:
+        import requests
+        get = http_client(args.url.rstrip('/'))
+        movies = discover_movies(lambda path: requests.get(args.url.rstrip('/') + path, timeout=30).json())
+        if not movies:
+            print("No movies found through /api/autocomplete; is the API up and the database imported?")
+            return
+
+    print(f"Running {args.concurrency} clients for {args.warmup:.0f}s warm-up + {args.duration:.0f}s "
+          f"over {len(movies)} movies...")
+    results, elapsed = run(get, movies, mix, args.concurrency, args.duration, args.warmup)
+    endpoints, total = report(results, elapsed)
+
+    print_table({**endpoints, 'total': total})
+    print(f"{'endpoint':<28}{'req/s':>10}{'errors':>10}")
+    for name, summary in {**endpoints, 'total': total}.items():
+        print(f"{name:<28}{summary['throughput_rps']:>10.1f}{summary['errors']:>10}")
+
+    if args.output:
+        write_json(args.output, {
+            'benchmark': 'load',
+            'target': 'in-process' if args.in_process else args.url,
+            'catalog_size': args.size if args.in_process else len(movies),
+            'db_latency_ms': args.db_latency_ms if args.in_process else None,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'mix': mix,
+            'endpoints': endpoints,
+            'total': total
+        })
+
+
+if __name__ == '__main__':
+    main()
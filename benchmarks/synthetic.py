@@ -0,0 +1,142 @@
+"""Generate a synthetic movie catalog for benchmarks
+
+Catalogs are deterministic for a given size and seed. Write one in the
+layout of data/movies_metadata.csv and import it into a local Postgres:
+
+    python -m benchmarks.synthetic --size 100000 --output data/synthetic_100k.csv
+    MOVIES_CSV=data/synthetic_100k.csv python import_movies.py
+
+or use generate_movies() directly with the in-process fakes (benchmarks/fakes.py).
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from genre_utils import assign_genre_bits, genre_mask
+
+# TMDB's genre ids and names
+GENRES = [
+    (28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'),
+    (99, 'Documentary'), (18, 'Drama'), (10751, 'Family'), (14, 'Fantasy'), (36, 'History'),
+    (27, 'Horror'), (10402, 'Music'), (9648, 'Mystery'), (10749, 'Romance'), (878, 'Science Fiction'),
+    (10770, 'TV Movie'), (53, 'Thriller'), (10752, 'War'), (37, 'Western'), (10769, 'Foreign')
+]
+
+_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ten', 'vor', 'sa', 'qui', 'del', 'mon', 'ar', 'eth',
+              'ul', 'zan', 'pri', 'dor', 'nes', 'tal', 'bri', 'os', 'fen', 'gar', 'hol', 'ix']
+
+
+def make_vocabulary(size, rng):
+    """Pseudo-words of 2-4 syllables (distinct, so TF-IDF sees a realistic vocabulary)"""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def generate_movies(size, seed=42, vocabulary_size=20000):
+    """Return size movies as rows shaped like the movies table (movie_id 1..size)
+
+    Popularity and vote counts are heavy tailed, genres are correlated with a
+    movie's "theme" so that similar movies exist, and about 5% of movies
+    belong to a collection.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    title_words = rng.sample(vocabulary, 2000)
+
+    # Each theme favours a few genres and a slice of the vocabulary
+    themes = []
+    for _ in range(50):
+        start = rng.randrange(len(vocabulary) - 500)
+        themes.append((rng.sample(GENRES, 3), vocabulary[start:start + 500]))
+
+    popularity = np_rng.pareto(1.5, size) + 0.1
+    vote_counts = (np_rng.pareto(1.2, size) * 20).astype(int)
+    epoch = datetime(1930, 1, 1)
+
+    movies = []
+    collections = [f"The {word.title()} Collection" for word in title_words[:size // 60 + 1]]
+    for movie_id in range(1, size + 1):
+        theme_genres, theme_words = themes[rng.randrange(len(themes))]
+        genres = rng.sample(theme_genres, rng.randint(1, 3))
+        if rng.random() < 0.3:
+            genres.append(rng.choice(GENRES))
+        genres = [{'id': genre_id, 'name': name} for genre_id, name in dict(genres).items()]
+
+        overview = ' '.join(rng.choice(theme_words) if rng.random() < 0.7 else rng.choice(vocabulary)
+                            for _ in range(rng.randint(15, 60)))
+        title = ' '.join(rng.choice(title_words).title() for _ in range(rng.randint(1, 4)))
+        movies.append({
+            'movie_id': movie_id,
+            'tmdb_id': 1000000 + movie_id,
+            'title': title,
+            'release_date': epoch + timedelta(days=rng.randrange(95 * 365)) if rng.random() > 0.01 else None,
+            'overview': overview,
+            'vote_average': round(min(10.0, max(0.0, rng.gauss(6.0, 1.3))), 1),
+            'vote_count': int(vote_counts[movie_id - 1]),
+            'popularity': round(float(popularity[movie_id - 1]), 3),
+            'genres': genres,
+            'budget': rng.choice([None, rng.randrange(100000, 200000000)]),
+            'revenue': rng.choice([None, rng.randrange(100000, 900000000)]),
+            'runtime': rng.randint(70, 180),
+            'collection_name': rng.choice(collections) if rng.random() < 0.05 else None,
+            'updated_at': epoch
+        })
+
+    # Genre bits are assigned the way import_genres does it
+    lookup = assign_genre_bits([[genre['name'] for genre in movie['genres']] for movie in movies])
+    bits = {name: bit for bit, name in enumerate(lookup)}
+    for movie in movies:
+        movie['genre_mask'] = genre_mask([genre['name'] for genre in movie['genres']], bits)
+    return movies, lookup
+
+
+def generate_embeddings(size, dims=256, seed=42):
+    """Random unit vectors, clustered so nearest neighbours are meaningful (float32, size x dims)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((50, dims), dtype=np.float32)
+    vectors = centers[rng.integers(0, len(centers), size)]
+    vectors += rng.standard_normal((size, dims), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def to_metadata_frame(movies):
+    """Lay movies out like data/movies_metadata.csv (what import_movies.py reads)"""
+    return pd.DataFrame({
+        'id': [movie['tmdb_id'] for movie in movies],
+        'title': [movie['title'] for movie in movies],
+        'release_date': [movie['release_date'].strftime('%Y-%m-%d') if movie['release_date'] else None
+                         for movie in movies],
+        'overview': [movie['overview'] for movie in movies],
+        'vote_average': [movie['vote_average'] for movie in movies],
+        'vote_count': [movie['vote_count'] for movie in movies],
+        'popularity': [movie['popularity'] for movie in movies],
+        'budget': [movie['budget'] or 0 for movie in movies],
+        'revenue': [movie['revenue'] or 0 for movie in movies],
+        'runtime': [movie['runtime'] for movie in movies],
+        'belongs_to_collection': [repr({'name': movie['collection_name']}) if movie['collection_name'] else None
+                                  for movie in movies],
+        'genres': [repr(movie['genres']) for movie in movies]
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000, help='Number of movies (e.g. 10000 to 500000)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', required=True, help='CSV path to write')
+    args = parser.parse_args()
+
+    movies, lookup = generate_movies(args.size, args.seed)
+    to_metadata_frame(movies).to_csv(args.output, index=False)
+    print(f"Wrote {len(movies)} movies with {len(lookup)} genres to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
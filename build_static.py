@@ -0,0 +1,67 @@
+"""Fingerprint and precompress the web app's static assets
+
+Writes static/dist/<name>.<hash>.<ext> for every script and stylesheet,
+with .gz (and .br, if brotli is installed) next to it, and
+static/dist/manifest.json mapping the original names to the fingerprinted
+ones. The web app serves these with immutable cache headers; run it again
+whenever the assets change (the Docker image runs it at build time).
+
+    python build_static.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from compression import brotli
+
+STATIC_DIR = os.getenv('STATIC_DIR', 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+ASSET_EXTENSIONS = ('.js', '.css')
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def build_asset(name):
+    """Write the fingerprinted and precompressed copies of one asset; return (dist name, sizes)"""
+    with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+        data = f.read()
+
+    root, ext = os.path.splitext(name)
+    dist_name = f"{root}.{fingerprint(data)}{ext}"
+    dist_path = os.path.join(DIST_DIR, dist_name)
+    os.makedirs(os.path.dirname(dist_path), exist_ok=True)
+
+    # Maximum levels: this runs once per build, not per request
+    variants = {'': data, '.gz': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    for suffix, content in variants.items():
+        with open(dist_path + suffix, 'wb') as f:
+            f.write(content)
+    return dist_name, {suffix or 'raw': len(content) for suffix, content in variants.items()}
+
+def main():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    manifest = {}
+    print(f"{'asset':<28}{'raw':>10}{'gzip':>10}{'brotli':>10}")
+    for directory, subdirectories, files in os.walk(STATIC_DIR):
+        subdirectories[:] = [d for d in subdirectories if os.path.join(directory, d) != DIST_DIR]
+        for filename in sorted(files):
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+            name = os.path.relpath(os.path.join(directory, filename), STATIC_DIR).replace(os.sep, '/')
+            dist_name, sizes = build_asset(name)
+            manifest[name] = dist_name
+            print(f"{name:<28}{sizes['raw']:>10}{sizes['.gz']:>10}{sizes.get('.br', '-'):>10}")
+
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(manifest)} assets to {DIST_DIR}")
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,399 @@ import redis
 import json
 import os
 import pickle
+import struct
+import zlib
+from array import array
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import time
+import hashlib
+import math
+import random
+import threading
+import uuid
+from collections import deque
+from instrumentation import stage, cache_result
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
 
 # Load environment variables
 load_dotenv()
 
+# Every value written by RedisCache starts with a header: the magic bytes,
+# the format version and a flags byte (codec id in the high nibble,
+# compression id in the low one). Version 2 adds the time it took to compute
+# the value in milliseconds, used for early refresh. Values without the magic
+# are legacy pickles.
+CODEC_MAGIC = b'MR'
+CODEC_FORMAT_VERSION = 2
+CODEC_HEADERS = {
+    1: struct.Struct('>2sBB'),
+    2: struct.Struct('>2sBBI')
+}
+
+# Naive datetimes in columnar values are stored as microseconds since this epoch
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+class PickleCodec:
+    """Fallback for values the other codecs cannot represent"""
+    codec_id = 0
+    name = 'pickle'
+    compressible = True
+
+    def accepts(self, value):
+        return True
+
+    def encode(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+class RawBytesCodec:
+    """Stores bytes as-is (images are already compressed)"""
+    codec_id = 1
+    name = 'raw'
+    compressible = False
+
+    def accepts(self, value):
+        return isinstance(value, (bytes, bytearray, memoryview))
+
+    def encode(self, value):
+        return bytes(value)
+
+    def decode(self, data):
+        return data
+
+class ColumnarCodec:
+    """Lists of rows with the same keys (e.g. recommendations), stored column by column
+    
+    Keys are written once instead of once per row, and numeric and datetime
+    columns are packed as fixed-width arrays instead of per-value objects.
+    """
+    codec_id = 2
+    name = 'columnar'
+    compressible = True
+
+    def accepts(self, value):
+        if not isinstance(value, list) or not value or not isinstance(value[0], dict):
+            return False
+        keys = list(value[0])
+        return all(isinstance(row, dict) and list(row) == keys for row in value)
+
+    def encode(self, value):
+        keys = list(value[0])
+        columns = []
+        for key in keys:
+            column = [row[key] for row in value]
+            kinds = {type(item) for item in column}
+            if kinds == {float}:
+                columns.append(('f', array('d', column).tobytes()))
+            elif kinds == {int}:
+                columns.append(('i', array('q', column).tobytes()))
+            elif kinds == {datetime} and all(item.tzinfo is None for item in column):
+                columns.append(('t', array('q', [(item - _EPOCH) // _MICROSECOND for item in column]).tobytes()))
+            else:
+                columns.append(('o', column))
+        return pickle.dumps((keys, columns), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        keys, packed = pickle.loads(data)
+        columns = []
+        for kind, column in packed:
+            if kind == 'f':
+                columns.append(array('d', column).tolist())
+            elif kind == 'i':
+                columns.append(array('q', column).tolist())
+            elif kind == 't':
+                columns.append([_EPOCH + item * _MICROSECOND for item in array('q', column)])
+            else:
+                columns.append(column)
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+# Codecs tried in order when encoding; register_codec adds to the front
+_codecs = [RawBytesCodec(), ColumnarCodec(), PickleCodec()]
+_codecs_by_id = {codec.codec_id: codec for codec in _codecs}
+
+def register_codec(codec):
+    """Add a codec (with codec_id 3-15) that takes precedence over the built-in ones"""
+    if not 0 <= codec.codec_id <= 15 or codec.codec_id in _codecs_by_id:
+        raise ValueError(f"Invalid or duplicate codec id: {codec.codec_id}")
+    _codecs.insert(0, codec)
+    _codecs_by_id[codec.codec_id] = codec
+
+# Compression ids: 0 none, 1 zlib, 2 zstd, 3 lz4
+_compressors = {1: (lambda data: zlib.compress(data, 1), zlib.decompress)}
+if zstandard is not None:
+    # zstandard compressor objects are not thread-safe: keep one per thread
+    _zstd = threading.local()
+
+    def _zstd_compress(data):
+        compressor = getattr(_zstd, 'compressor', None)
+        if compressor is None:
+            compressor = _zstd.compressor = zstandard.ZstdCompressor(level=3)
+        return compressor.compress(data)
+
+    _compressors[2] = (_zstd_compress, lambda data: zstandard.ZstdDecompressor().decompress(data))
+if lz4 is not None:
+    _compressors[3] = (lz4.frame.compress, lz4.frame.decompress)
+_compression_names = {'none': 0, 'zlib': 1, 'zstd': 2, 'lz4': 3}
+
+def _default_compression():
+    name = os.getenv('CACHE_COMPRESSION', '').lower()
+    if name:
+        compression_id = _compression_names.get(name, 0)
+        if compression_id and compression_id not in _compressors:
+            print(f"Cache compression '{name}' is not installed, using zlib")
+            return 1
+        return compression_id
+    # Prefer the fastest compressor installed
+    for compression_id in (2, 3, 1):
+        if compression_id in _compressors:
+            return compression_id
+
+COMPRESSION = _default_compression()
+COMPRESS_MIN_BYTES = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 1024))
+
+def encode_value(value, codec=None, compute_ms=0):
+    """Serialize a value for Redis: header + (optionally compressed) payload"""
+    if codec is None:
+        codec = next(c for c in _codecs if c.accepts(value))
+    try:
+        payload = codec.encode(value)
+    except (TypeError, ValueError, OverflowError):
+        # e.g. an int column too wide for a 64-bit array
+        codec = _codecs_by_id[PickleCodec.codec_id]
+        payload = codec.encode(value)
+
+    compression_id = 0
+    if codec.compressible and COMPRESSION and len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = _compressors[COMPRESSION][0](payload)
+        if len(compressed) < len(payload):
+            payload = compressed
+            compression_id = COMPRESSION
+
+    flags = (codec.codec_id << 4) | compression_id
+    header = CODEC_HEADERS[CODEC_FORMAT_VERSION]
+    return header.pack(CODEC_MAGIC, CODEC_FORMAT_VERSION, flags, min(int(compute_ms), 0xFFFFFFFF)) + payload
+
+def decode_entry(data):
+    """Deserialize bytes written by encode_value into (value, compute_ms)"""
+    if data[:2] != CODEC_MAGIC:
+        return pickle.loads(data), 0
+
+    version = data[2]
+    if version not in CODEC_HEADERS:
+        raise ValueError(f"Unsupported cache format version {version}")
+    header = CODEC_HEADERS[version].unpack_from(data)
+    flags = header[2]
+    compute_ms = header[3] if version >= 2 else 0
+
+    payload = data[CODEC_HEADERS[version].size:]
+    compression_id = flags & 0x0F
+    if compression_id:
+        if compression_id not in _compressors:
+            raise ValueError(f"Compression {compression_id} is not installed")
+        payload = _compressors[compression_id][1](payload)
+    return _codecs_by_id[flags >> 4].decode(payload), compute_ms
+
+def decode_value(data):
+    """Deserialize bytes written by encode_value (or a legacy pickle)"""
+    return decode_entry(data)[0]
+
+class _Flight:
+    """One in-progress computation that concurrent callers in this process wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def single_flight(key, compute):
+    """Run compute once per key at a time within this process; other callers get its result"""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    cache_result('single_flight', 'miss' if leader else 'hit', _domain(key))
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = compute()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+# Deletes the lock only if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Cached data domains and the key prefix each one lives under. Every key is
+# written as "<prefix>:g<generation>:...", so invalidating a domain is a
+# single INCR of gen:<domain>; keys from older generations are never read
+# again and are unlinked in the background.
+CACHE_DOMAINS = {
+    'recommendations': 'recommendations',
+    'visualizations': 'viz',
+    'search': 'search'
+}
+
+# How many recommendations are cached per movie (requests up to this limit are served from it)
+RECOMMENDATION_CACHE_DEPTH = int(os.getenv('RECOMMENDATION_CACHE_DEPTH', 10))
+
+def _domain(key):
+    """Cache domain a key belongs to, for the hit/miss counters"""
+    prefix = key.split(':', 1)[0]
+    for domain, domain_prefix in CACHE_DOMAINS.items():
+        if prefix == domain_prefix:
+            return domain
+    return prefix
+
+# Process-wide memo of the generations so each request does not pay a round trip
+_generations = {'values': None, 'checked_at': 0}
+
+class CacheUnavailable(Exception):
+    """Raised instead of calling Redis while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Stops calling Redis after repeated failures so an outage costs no latency
+
+    closed: calls go through and their outcomes are kept in a sliding window;
+    the circuit opens once enough of them failed. open: calls are skipped
+    until reset_timeout has passed. half_open: a single probe call goes
+    through; success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, window=20, min_failures=5, failure_rate=0.5, reset_timeout=10.0):
+        self.window = window
+        self.min_failures = min_failures
+        self.failure_rate = failure_rate
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = 0
+        self.probe_started = None
+        self.times_opened = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def _probe_due(self, now):
+        if self.state == 'open':
+            return now - self.opened_at >= self.reset_timeout
+        # A probe that never reported back (e.g. its thread died) is replaced
+        return self.probe_started is None or now - self.probe_started >= self.reset_timeout
+
+    def available(self):
+        """Whether a caller should try Redis at all right now"""
+        return self.state == 'closed' or self._probe_due(time.monotonic())
+
+    def allow(self):
+        """Whether a call may go through, taking the probe slot when one is due"""
+        if self.state == 'closed':
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'closed':
+                return True
+            if not self._probe_due(now):
+                return False
+            self.state = 'half_open'
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        if self.state == 'closed':
+            self.outcomes.append(True)
+            return
+        with self._lock:
+            if self.state != 'closed':
+                print("Redis circuit closed")
+            self.state = 'closed'
+            self.outcomes.clear()
+            self.probe_started = None
+
+    def record_failure(self, error):
+        with self._lock:
+            self.last_error = str(error)
+            if self.state == 'closed':
+                self.outcomes.append(False)
+                failures = self.outcomes.count(False)
+                if failures < self.min_failures or failures < self.failure_rate * len(self.outcomes):
+                    return
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+            self.times_opened += 1
+            print(f"Redis circuit opened for {self.reset_timeout}s: {error}")
+
+    def snapshot(self):
+        """Current state for status reporting"""
+        outcomes = list(self.outcomes)
+        snapshot = {
+            'state': self.state,
+            'recent_calls': len(outcomes),
+            'recent_failures': outcomes.count(False),
+            'times_opened': self.times_opened,
+            'last_error': self.last_error
+        }
+        if self.state == 'open':
+            snapshot['retry_in_seconds'] = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return snapshot
+
+# One breaker and one connection pool per process, shared by every RedisCache
+breaker = CircuitBreaker(
+    window=int(os.getenv('REDIS_BREAKER_WINDOW', 20)),
+    min_failures=int(os.getenv('REDIS_BREAKER_MIN_FAILURES', 5)),
+    failure_rate=float(os.getenv('REDIS_BREAKER_FAILURE_RATE', 0.5)),
+    reset_timeout=float(os.getenv('REDIS_BREAKER_RESET_SECONDS', 10))
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _connection_pool(host, port, password):
+    """Return the shared connection pool for a Redis server"""
+    key = (host, port, password)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = redis.ConnectionPool(
+                host=host,
+                port=port,
+                password=password,
+                socket_timeout=float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.25)),
+                socket_connect_timeout=float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.25)),
+                max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+            )
+        return pool
+
 class RedisCache:
     """Redis caching utility for the movie recommendation system"""
     
@@ -16,28 +403,55 @@ class RedisCache:
         self.redis_port = int(os.getenv('REDIS_PORT', 6379))
         self.redis_password = os.getenv('REDIS_PASSWORD', None)
         self.default_ttl = int(os.getenv('REDIS_DEFAULT_TTL', 86400))  # 24 hours
+        self.search_ttl = int(os.getenv('REDIS_SEARCH_TTL', 3600))  # 1 hour
+        self.search_negative_ttl = int(os.getenv('REDIS_SEARCH_NEGATIVE_TTL', 300))  # 5 minutes
+        self.generation_check_interval = float(os.getenv('REDIS_GENERATION_CHECK_SECONDS', 5))
+        self.lock_timeout = float(os.getenv('REDIS_LOCK_TIMEOUT_SECONDS', 30))
+        self.lock_wait = float(os.getenv('REDIS_LOCK_WAIT_SECONDS', 5))
+        self.early_refresh_beta = float(os.getenv('REDIS_EARLY_REFRESH_BETA', 1.0))
         self.client = None
         
     def connect(self):
-        """Connect to Redis"""
+        """Connect to Redis (returns False without trying while the circuit is open)"""
+        if not breaker.available():
+            self.client = None
+            return False
+        self.client = redis.Redis(
+            connection_pool=_connection_pool(self.redis_host, self.redis_port, self.redis_password)
+        )
+        return True
+        
+    def ping(self):
+        """Check that Redis answers"""
+        if not self.client:
+            return False
         try:
-            self.client = redis.Redis(
-                host=self.redis_host,
-                port=self.redis_port,
-                password=self.redis_password,
-                decode_responses=False  # Keep as bytes for binary data
-            )
-            self.client.ping()  # Test connection
-            return True
-        except redis.ConnectionError as e:
+            return bool(self._run(self.client.ping))
+        except Exception as e:
             print(f"Error connecting to Redis: {e}")
             return False
             
     def disconnect(self):
-        """Close the Redis connection"""
+        """Return the connection to the shared pool"""
         if self.client:
             self.client.close()
             
+    def _run(self, command, *args, **kwargs):
+        """Run a Redis command through the circuit breaker"""
+        if not breaker.allow():
+            raise CacheUnavailable("Redis circuit is open")
+        try:
+            result = command(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            breaker.record_failure(e)
+            raise
+        except redis.RedisError:
+            # Redis answered, it just rejected the command
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+            
     def __enter__(self):
         self.connect()
         return self
@@ -48,19 +462,22 @@ class RedisCache:
     def get(self, key):
         """Get a value from the cache"""
         if not self.client:
+            cache_result('redis', 'skipped', _domain(key))
             return None
             
         try:
-            data = self.client.get(key)
-            if data:
-                return pickle.loads(data)
-            return None
+            with stage('cache_get'):
+                data = self._run(self.client.get, key)
+                value = decode_value(data) if data else None
+            cache_result('redis', 'miss' if value is None else 'hit', _domain(key))
+            return value
         except Exception as e:
+            cache_result('redis', 'error', _domain(key))
             print(f"Error retrieving from cache: {e}")
             return None
             
-    def set(self, key, value, ttl=None):
-        """Set a value in the cache with optional TTL"""
+    def set(self, key, value, ttl=None, codec=None):
+        """Set a value in the cache with optional TTL (codec is picked from the value by default)"""
         if not self.client:
             return False
             
@@ -68,9 +485,9 @@ class RedisCache:
             ttl = self.default_ttl
             
         try:
-            # Use pickle to serialize complex objects
-            serialized_value = pickle.dumps(value)
-            return self.client.setex(key, ttl, serialized_value)
+            with stage('cache_set'):
+                serialized_value = encode_value(value, codec)
+                return self._run(self.client.setex, key, ttl, serialized_value)
         except Exception as e:
             print(f"Error setting cache: {e}")
             return False
@@ -81,23 +498,276 @@ class RedisCache:
             return False
             
         try:
-            return self.client.delete(key) > 0
+            return self._run(self.client.delete, key) > 0
         except Exception as e:
             print(f"Error deleting from cache: {e}")
             return False
             
+    def exists(self, key):
+        """Check whether a key is cached without fetching its value"""
+        if not self.client:
+            return False
+            
+        try:
+            return self._run(self.client.exists, key) > 0
+        except Exception as e:
+            print(f"Error checking cache: {e}")
+            return False
+            
+    def get_or_compute(self, key, compute, ttl=None):
+        """Return the cached value for key, computing it at most once across callers
+        
+        Concurrent misses in this process share one call to compute; across
+        processes a Redis lock elects one caller and the others wait briefly
+        for its result. Before a key expires it is refreshed early with a
+        probability that rises as expiry nears (XFetch), while other callers
+        keep getting the current value. None results are not cached.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+            
+        value, compute_ms, ttl_ms = self._get_entry(key)
+        if value is not None:
+            if not self._should_refresh_early(compute_ms, ttl_ms):
+                return value
+            # Only the caller that wins the lock refreshes; everyone else keeps the current value
+            token = self._acquire_lock(key)
+            if token is None:
+                return value
+            try:
+                return self._compute_and_set(key, compute, ttl)
+            except Exception as e:
+                # A failed (or shed) refresh still has the current value to return
+                print(f"Error refreshing cache entry early: {e}")
+                return value
+            finally:
+                self._release_lock(key, token)
+                
+        return single_flight(key, lambda: self._compute_on_miss(key, compute, ttl))
+        
+    def _get_entry(self, key):
+        """Get (value, compute_ms, remaining ttl in ms) for key; value is None on a miss"""
+        if not self.client:
+            cache_result('redis', 'skipped', _domain(key))
+            return None, 0, 0
+            
+        try:
+            with stage('cache_get'):
+                pipe = self.client.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.pttl(key)
+                data, ttl_ms = self._run(pipe.execute)
+                value, compute_ms = decode_entry(data) if data else (None, 0)
+            cache_result('redis', 'miss' if value is None else 'hit', _domain(key))
+            if value is None:
+                return None, 0, 0
+            return value, compute_ms, ttl_ms
+        except Exception as e:
+            cache_result('redis', 'error', _domain(key))
+            print(f"Error retrieving from cache: {e}")
+            return None, 0, 0
+            
+    def _should_refresh_early(self, compute_ms, ttl_ms):
+        """XFetch: refresh when -compute_time * beta * ln(U) reaches the remaining TTL"""
+        if ttl_ms < 0 or compute_ms <= 0:
+            return False
+        return -compute_ms * self.early_refresh_beta * math.log(1.0 - random.random()) >= ttl_ms
+        
+    def _compute_and_set(self, key, compute, ttl):
+        start_time = time.perf_counter()
+        value = compute()
+        if value is not None and self.client:
+            compute_ms = (time.perf_counter() - start_time) * 1000
+            try:
+                with stage('cache_set'):
+                    self._run(self.client.setex, key, ttl, encode_value(value, compute_ms=compute_ms))
+            except Exception as e:
+                print(f"Error setting cache: {e}")
+        return value
+        
+    def _compute_on_miss(self, key, compute, ttl):
+        if not self.client:
+            return compute()
+            
+        token = self._acquire_lock(key)
+        if token is not None:
+            try:
+                return self._compute_and_set(key, compute, ttl)
+            finally:
+                self._release_lock(key, token)
+                
+        # Another process is computing it: wait for the value to appear
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                # Polled directly so waiting does not count as repeated misses
+                data = self._run(self.client.get, key)
+                if data:
+                    return decode_value(data)
+                if not self._run(self.client.exists, f"lock:{key}"):
+                    break
+            except Exception:
+                break
+                
+        # The other caller failed or is too slow; compute without the lock
+        return self._compute_and_set(key, compute, ttl)
+        
+    def _acquire_lock(self, key):
+        """Take the recompute lock for key, returning its token (None if held elsewhere)"""
+        if not self.client:
+            return None
+        token = uuid.uuid4().hex
+        try:
+            if self._run(self.client.set, f"lock:{key}", token, nx=True, px=int(self.lock_timeout * 1000)):
+                return token
+            return None
+        except Exception as e:
+            print(f"Error acquiring cache lock: {e}")
+            return None
+            
+    def _release_lock(self, key, token):
+        try:
+            self._run(self.client.eval, _RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            print(f"Error releasing cache lock: {e}")
+            
+    def recommendations_key(self, movie_id, generation=None):
+        if generation is None:
+            generation = self.get_generation('recommendations')
+        return f"recommendations:g{generation}:{movie_id}"
+        
+    def visualization_key(self, movie_id, viz_type):
+        return f"viz:g{self.get_generation('visualizations')}:{movie_id}:{viz_type}"
+        
+    def search_key(self, normalized_query, variant=''):
+        # Keep keys short for long queries
+        if len(normalized_query) > 100:
+            normalized_query = hashlib.sha1(normalized_query.encode('utf-8')).hexdigest()
+        if variant:
+            variant = hashlib.sha1(variant.encode('utf-8')).hexdigest()[:12]
+        return f"search:g{self.get_generation('search')}:{variant}:{normalized_query}"
+        
     def get_recommendations(self, movie_id):
         """Get cached recommendations for a movie"""
-        return self.get(f"recommendations:{movie_id}")
+        return self.get(self.recommendations_key(movie_id))
         
     def set_recommendations(self, movie_id, recommendations, ttl=None):
         """Cache recommendations for a movie"""
-        return self.set(f"recommendations:{movie_id}", recommendations, ttl)
+        return self.set(self.recommendations_key(movie_id), recommendations, ttl)
         
     def get_visualization(self, movie_id, viz_type):
         """Get a cached visualization for a movie"""
-        return self.get(f"viz:{movie_id}:{viz_type}")
+        return self.get(self.visualization_key(movie_id, viz_type))
         
     def set_visualization(self, movie_id, viz_type, image_data, ttl=None):
         """Cache a visualization for a movie"""
-        return self.set(f"viz:{movie_id}:{viz_type}", image_data, ttl)
\ No newline at end of file
+        return self.set(self.visualization_key(movie_id, viz_type), image_data, ttl)
+        
+    def set_many(self, entries, ttl=None):
+        """Write (key, value, compute_ms) entries in one pipelined round trip
+        
+        Returns how many were written (0 if Redis is unavailable).
+        """
+        if not self.client or not entries:
+            return 0
+            
+        if ttl is None:
+            ttl = self.default_ttl
+            
+        try:
+            with stage('cache_set'):
+                pipe = self.client.pipeline(transaction=False)
+                for key, value, compute_ms in entries:
+                    pipe.setex(key, ttl, encode_value(value, compute_ms=compute_ms))
+                self._run(pipe.execute)
+            return len(entries)
+        except Exception as e:
+            print(f"Error setting cache entries: {e}")
+            return 0
+            
+    def get_generation(self, domain):
+        """Get the current generation of a cache domain (re-read from Redis every few seconds)"""
+        now = time.time()
+        if self.client and (_generations['values'] is None
+                            or now - _generations['checked_at'] > self.generation_check_interval):
+            try:
+                domains = list(CACHE_DOMAINS)
+                values = self._run(self.client.mget, [f"gen:{name}" for name in domains])
+                _generations['values'] = {name: int(value or 0) for name, value in zip(domains, values)}
+                _generations['checked_at'] = now
+            except Exception as e:
+                print(f"Error reading cache generations: {e}")
+        return (_generations['values'] or {}).get(domain, 0)
+        
+    def invalidate(self, domain):
+        """Invalidate every key of a domain by starting a new generation
+        
+        Returns the new generation, or None if Redis is unavailable. Keys of
+        older generations are removed later by collect_stale_keys.
+        """
+        if not self.client:
+            return None
+            
+        try:
+            generation = self._run(self.client.incr, f"gen:{domain}")
+            if _generations['values'] is not None:
+                _generations['values'][domain] = generation
+            return generation
+        except Exception as e:
+            print(f"Error invalidating cache domain {domain}: {e}")
+            return None
+            
+    def collect_stale_keys(self, domain, batch_size=500):
+        """UNLINK keys left over from older generations of a domain
+        
+        Walks the keyspace incrementally with SCAN so Redis is never blocked
+        for long. Returns the number of keys removed.
+        """
+        if not self.client:
+            return 0
+            
+        prefix = CACHE_DOMAINS[domain]
+        try:
+            current = int(self._run(self.client.get, f"gen:{domain}") or 0)
+            removed = 0
+            stale = []
+            for pattern in (f"{prefix}:g*", f"lock:{prefix}:g*"):
+                cursor = 0
+                while True:
+                    cursor, keys = self._run(self.client.scan, cursor, match=pattern, count=1000)
+                    for key in keys:
+                        generation = key.decode('utf-8', 'replace').split(':g', 1)[1].split(':', 1)[0]
+                        if generation.isdigit() and int(generation) < current:
+                            stale.append(key)
+                        if len(stale) >= batch_size:
+                            removed += self._run(self.client.unlink, *stale)
+                            stale = []
+                    if cursor == 0:
+                        break
+            if stale:
+                removed += self._run(self.client.unlink, *stale)
+            return removed
+        except Exception as e:
+            print(f"Error collecting stale keys for {domain}: {e}")
+            return 0
+        
+    def get_search_results(self, normalized_query, variant=''):
+        """Get cached search results for a normalized query
+        
+        variant distinguishes pages and projections of the same query.
+        """
+        return self.get(self.search_key(normalized_query, variant))
+        
+    def set_search_results(self, normalized_query, result, variant='', ttl=None, empty=None):
+        """Cache search results; empty results get the shorter negative TTL
+        
+        result is the response dict, or the response body as bytes (then pass
+        empty, as it cannot be inspected).
+        """
+        key = self.search_key(normalized_query, variant)
+        if ttl is None:
+            if empty is None:
+                empty = not result.get('exact_match') and not result.get('similar_movies')
+            ttl = self.search_negative_ttl if empty else self.search_ttl
+        return self.set(key, result, ttl)
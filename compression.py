@@ -0,0 +1,78 @@
+"""Content-Encoding negotiation shared by the API and the web app"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is: the headers and CPU cost more than the bytes saved
+COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', 4))
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/plain', 'text/css',
+    'application/javascript', 'text/javascript', 'image/svg+xml'
+}
+
+_encoders = {'gzip': lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    _encoders['br'] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+
+def accepted_encodings(accept_encoding):
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def choose_encoding(accept_encoding, available=None):
+    """Pick the best coding the client accepts (brotli over gzip), or None"""
+    available = _encoders if available is None else available
+    accepted = accepted_encodings(accept_encoding)
+    for coding in ('br', 'gzip'):
+        if coding in available and accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+def compress_response(response, accept_encoding):
+    """Compress a buffered Flask response in place when it is worth it
+
+    Streamed and file responses (proxy pass-through, images, static files)
+    are left alone, as are bodies that are already encoded or too small.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    coding = choose_encoding(accept_encoding)
+    if coding is None:
+        return response
+
+    response.set_data(_encoders[coding](data))
+    response.headers['Content-Encoding'] = coding
+    # The encoded body is a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
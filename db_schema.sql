@@ -3,10 +3,21 @@ DROP MATERIALIZED VIEW IF EXISTS top_genres;
 DROP INDEX IF EXISTS idx_visualizations_movie;
 DROP INDEX IF EXISTS idx_similarities_score;
 DROP INDEX IF EXISTS idx_similarities_source;
+DROP INDEX IF EXISTS idx_similarities_source_score;
+DROP INDEX IF EXISTS idx_movies_vote_average;
+DROP INDEX IF EXISTS idx_movies_release_date;
+DROP INDEX IF EXISTS idx_movies_genres;
+DROP INDEX IF EXISTS idx_movies_updated_at;
+DROP INDEX IF EXISTS idx_movies_title_trgm;
 DROP INDEX IF EXISTS idx_movies_title;
 DROP TABLE IF EXISTS visualizations;
+DROP TABLE IF EXISTS movie_neighbors;
 DROP TABLE IF EXISTS movie_similarities;
 DROP TABLE IF EXISTS movies;
+DROP TABLE IF EXISTS genres;
+
+-- Trigram matching for fuzzy title search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Create tables for our movie recommendation system
 CREATE TABLE IF NOT EXISTS movies (
@@ -16,13 +27,35 @@ CREATE TABLE IF NOT EXISTS movies (
     release_date TIMESTAMP,  -- Allow NULL dates
     overview TEXT,
     vote_average FLOAT,
+    vote_count INTEGER,
+    popularity FLOAT,
     genres JSONB,
     budget FLOAT,
     revenue FLOAT,
     runtime FLOAT,
-    collection_name VARCHAR(255)
+    collection_name VARCHAR(255),
+    genre_mask BIGINT NOT NULL DEFAULT 0,  -- One bit per genres.genre_id
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Genre names by bit position in movies.genre_mask
+CREATE TABLE IF NOT EXISTS genres (
+    genre_id SMALLINT PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL
 );
 
+-- Keep movies.updated_at current so in-memory indexes can refresh incrementally
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_movies_updated_at
+    BEFORE UPDATE ON movies
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
 -- Table to store pre-computed similarities between movies
 CREATE TABLE IF NOT EXISTS movie_similarities (
     id SERIAL PRIMARY KEY,
@@ -32,6 +65,14 @@ CREATE TABLE IF NOT EXISTS movie_similarities (
     UNIQUE(source_movie_id, target_movie_id)
 );
 
+-- The same neighbours packed into one row per movie, in rank order
+-- (used when NEIGHBOR_STORAGE=arrays)
+CREATE TABLE IF NOT EXISTS movie_neighbors (
+    source_movie_id INTEGER PRIMARY KEY REFERENCES movies(movie_id),
+    target_ids INTEGER[] NOT NULL,
+    scores REAL[] NOT NULL
+);
+
 -- Table to cache visualization images
 CREATE TABLE IF NOT EXISTS visualizations (
     id SERIAL PRIMARY KEY,
@@ -44,8 +85,13 @@ CREATE TABLE IF NOT EXISTS visualizations (
 
 -- Create indexes for faster queries
 CREATE INDEX idx_movies_title ON movies(LOWER(title));
-CREATE INDEX idx_similarities_source ON movie_similarities(source_movie_id);
-CREATE INDEX idx_similarities_score ON movie_similarities(similarity_score DESC);
+CREATE INDEX idx_movies_title_trgm ON movies USING GIN (LOWER(title) gin_trgm_ops);
+CREATE INDEX idx_movies_updated_at ON movies(updated_at);
+CREATE INDEX idx_movies_genres ON movies USING GIN (genres jsonb_path_ops);
+CREATE INDEX idx_movies_release_date ON movies(release_date);
+CREATE INDEX idx_movies_vote_average ON movies(vote_average);
+-- Reads a movie's candidate pool already in score order
+CREATE INDEX idx_similarities_source_score ON movie_similarities(source_movie_id, similarity_score DESC);
 CREATE INDEX idx_visualizations_movie ON visualizations(movie_id);
 
 -- Create a materialized view for top genres
@@ -1,8 +1,16 @@
 import os
+import re
+import hashlib
+import threading
 import psycopg2
+import psycopg2.errors
+from psycopg2.extensions import connection as PgConnection
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 import json
+from datetime import datetime
 from dotenv import load_dotenv
+from instrumentation import stage
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +22,153 @@ def get_secret(secret_name):
             return f.read().strip()
     return os.getenv(secret_name.upper().replace('-', '_'), '')
 
+# Where the precomputed neighbours live: 'rows' (movie_similarities, one row
+# per pair) or 'arrays' (movie_neighbors, one row per movie with the targets
+# and scores packed in rank order)
+NEIGHBOR_STORAGE = os.getenv('NEIGHBOR_STORAGE', 'rows')
+
+# Columns of the movies table that callers may request with fields=
+MOVIE_FIELDS = (
+    'movie_id', 'tmdb_id', 'title', 'release_date', 'overview', 'vote_average', 'vote_count',
+    'popularity', 'genres', 'genre_mask', 'budget', 'revenue', 'runtime', 'collection_name'
+)
+
+# What the results list shows (and what the evaluation metrics read)
+MOVIE_SUMMARY_FIELDS = ('movie_id', 'title', 'release_date', 'vote_average', 'genre_mask')
+
+def parse_fields(value, default=MOVIE_SUMMARY_FIELDS):
+    """Parse a comma separated fields= parameter into a tuple of movie columns
+    
+    movie_id is always included. Raises ValueError for unknown column names.
+    """
+    if not value:
+        return tuple(default)
+    fields = ['movie_id']
+    for name in value.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in MOVIE_FIELDS:
+            raise ValueError(f"Unknown field: {name}")
+        fields.append(name)
+    return tuple(fields)
+
+def movie_columns(fields, alias='m'):
+    """Render a projection list for the movies table (fields must come from MOVIE_FIELDS)"""
+    return ', '.join(f'{alias}.{field}' for field in fields)
+
+# How the API's JSON responses format timestamps (HTTP date, as Flask does)
+JSON_DATE_FORMAT = 'Dy, DD Mon YYYY HH24:MI:SS "GMT"'
+
+# Genre names of a movie's genre_mask, as a JSON array
+GENRE_NAMES_JSON = """(SELECT COALESCE(json_agg(g.name ORDER BY g.genre_id), '[]')
+     FROM genres g WHERE {alias}.genre_mask & (1::bigint << g.genre_id) <> 0)"""
+
+def json_array(columns, order_by, alias='r'):
+    """Render an aggregate that builds a JSON array of objects with the given columns
+    
+    The objects match what the API's Python path serializes, including
+    genre_names when genre_mask is present. Aggregates to '[]' on no rows.
+    """
+    pairs = []
+    for column in columns:
+        value = f"{alias}.{column}"
+        if column == 'release_date':
+            value = f"to_char({value}, '{JSON_DATE_FORMAT}')"
+        pairs.append(f"'{column}', {value}")
+    if 'genre_mask' in columns:
+        pairs.append(f"'genre_names', {GENRE_NAMES_JSON.format(alias=alias)}")
+    return f"COALESCE(json_agg(json_build_object({', '.join(pairs)}) ORDER BY {order_by}), '[]')::text"
+
+def movie_filter_clause(filters, alias='m'):
+    """Render recommendation filters as (" AND ..." conditions, params)
+    
+    filters may hold genres (names that must all be present), year_from and
+    year_to (inclusive), min_rating and exclude (movie ids). Each condition
+    can use an index: the GIN index on genres or a btree index.
+    """
+    conditions = []
+    params = []
+    if filters.get('genres'):
+        conditions.append(f"{alias}.genres @> %s::jsonb")
+        params.append(json.dumps([{'name': genre} for genre in filters['genres']]))
+    if filters.get('year_from') is not None:
+        conditions.append(f"{alias}.release_date >= %s")
+        params.append(datetime(filters['year_from'], 1, 1))
+    if filters.get('year_to') is not None:
+        conditions.append(f"{alias}.release_date < %s")
+        params.append(datetime(filters['year_to'] + 1, 1, 1))
+    if filters.get('min_rating') is not None:
+        conditions.append(f"{alias}.vote_average >= %s")
+        params.append(filters['min_rating'])
+    if filters.get('exclude'):
+        conditions.append(f"{alias}.movie_id <> ALL(%s)")
+        params.append(list(filters['exclude']))
+    return ''.join(f" AND {condition}" for condition in conditions), params
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input is matched literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# Connections kept open per process (0 opens a new connection per Database)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
+# Run the hot queries as server-side prepared statements on pooled connections
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+
+class PreparingConnection(PgConnection):
+    """A connection that remembers which statements it has prepared on the server"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+_pool = {'pid': None, 'pool': None}
+_pool_lock = threading.Lock()
+
+def get_connection_pool(conn_params):
+    """Return this process's connection pool, or None when pooling is disabled
+    
+    The pool is keyed on the process id: a worker forked from a master that
+    already opened connections must not share their sockets.
+    """
+    if DB_POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool['pid'] != os.getpid():
+            _pool['pool'] = ThreadedConnectionPool(
+                1, DB_POOL_SIZE, connection_factory=PreparingConnection, **conn_params)
+            _pool['pid'] = os.getpid()
+        return _pool['pool']
+
+# Statements prepared per connection at most (field lists and filters vary)
+MAX_PREPARED_STATEMENTS = 200
+
+# psycopg2 placeholders: %(name)s, %s, or an escaped %%
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+
+def to_server_placeholders(query, params):
+    """Rewrite psycopg2 placeholders as $1, $2, ... for PREPARE
+    
+    Returns (statement, params in $n order).
+    """
+    ordered = []
+    positions = {}
+    
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None:
+            ordered.append(params[len(ordered)])
+            return f'${len(ordered)}'
+        if name not in positions:
+            ordered.append(params[name])
+            positions[name] = len(ordered)
+        return f'${positions[name]}'
+    
+    return _PLACEHOLDER.sub(replace, query), ordered
+
 class Database:
     """Database connection utility for the movie recommendation system"""
     
@@ -27,11 +182,21 @@ class Database:
         }
         self.conn = None
         self.cursor = None
+        self.pool = None
         
     def connect(self):
-        """Connect to the PostgreSQL database"""
+        """Connect to the PostgreSQL database (a pooled connection when DB_POOL_SIZE is set)"""
         try:
-            self.conn = psycopg2.connect(**self.conn_params)
+            pool = get_connection_pool(self.conn_params)
+            if pool is not None:
+                try:
+                    self.conn = pool.getconn()
+                    self.pool = pool
+                except PoolError:
+                    # Every pooled connection is busy: fall back to a private one
+                    self.conn = None
+            if self.conn is None:
+                self.conn = psycopg2.connect(connection_factory=PreparingConnection, **self.conn_params)
             self.cursor = self.conn.cursor(cursor_factory=RealDictCursor)
             return True
         except Exception as e:
@@ -39,11 +204,17 @@ class Database:
             return False
             
     def disconnect(self):
-        """Close the database connection"""
+        """Close the database connection (or return it to the pool)"""
         if self.cursor:
             self.cursor.close()
         if self.conn:
-            self.conn.close()
+            if self.pool is not None:
+                # The pool rolls back any open transaction; broken connections are dropped
+                self.pool.putconn(self.conn, close=bool(self.conn.closed))
+            else:
+                self.conn.close()
+            self.conn = None
+            self.pool = None
             
     def __enter__(self):
         self.connect()
@@ -52,20 +223,56 @@ class Database:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.disconnect()
         
-    def execute(self, query, params=None, commit=False):
-        """Execute a query and optionally commit the transaction"""
+    def execute(self, query, params=None, commit=False, prepare=False):
+        """Execute a query and optionally commit the transaction
+        
+        prepare=True runs it as a server-side prepared statement when the
+        connection is pooled, so Postgres parses and plans it once per
+        connection instead of once per call.
+        """
         try:
-            self.cursor.execute(query, params or ())
+            with stage('db_query'):
+                if prepare and self.pool is not None and DB_PREPARED_STATEMENTS:
+                    self._execute_prepared(query, params or ())
+                else:
+                    self.cursor.execute(query, params or ())
             if commit:
                 self.conn.commit()
             return True
         except Exception as e:
-            self.conn.rollback()
+            if not self.conn.closed:
+                self.conn.rollback()
             print(f"Error executing query: {e}")
             print(f"Query: {query}")
             print(f"Params: {params}")
             return False
             
+    def _execute_prepared(self, query, params):
+        statement, ordered = to_server_placeholders(query, params)
+        name = 'stmt_' + hashlib.sha1(statement.encode('utf-8')).hexdigest()[:16]
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * len(ordered))})" if ordered else f"EXECUTE {name}"
+        
+        if name not in self.conn.prepared:
+            if len(self.conn.prepared) >= MAX_PREPARED_STATEMENTS:
+                self.cursor.execute(query, params)
+                return
+            self._prepare(name, statement)
+        try:
+            self.cursor.execute(execute, ordered)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The server lost it (e.g. DISCARD ALL): prepare again and retry once
+            self.conn.rollback()
+            self.conn.prepared.discard(name)
+            self._prepare(name, statement)
+            self.cursor.execute(execute, ordered)
+            
+    def _prepare(self, name, statement):
+        try:
+            self.cursor.execute(f"PREPARE {name} AS {statement}")
+        except psycopg2.errors.DuplicatePreparedStatement:
+            self.conn.rollback()
+        self.conn.prepared.add(name)
+            
     def fetchall(self):
         """Fetch all results from the last query"""
         return self.cursor.fetchall()
@@ -74,31 +281,203 @@ class Database:
         """Fetch one result from the last query"""
         return self.cursor.fetchone()
         
+    def get_movie_by_id(self, movie_id, fields=MOVIE_FIELDS):
+        """Get a movie by its ID"""
+        query = f"SELECT {movie_columns(fields)} FROM movies m WHERE m.movie_id = %s"
+        self.execute(query, (movie_id,), prepare=True)
+        return self.fetchone()
+        
+    def get_movies_by_ids(self, movie_ids, fields=MOVIE_FIELDS):
+        """Get several movies by ID, in the order the IDs are given"""
+        query = f"SELECT {movie_columns(fields)} FROM movies m WHERE m.movie_id = ANY(%s)"
+        self.execute(query, (list(movie_ids),))
+        rows = {row['movie_id']: row for row in self.fetchall()}
+        return [rows[movie_id] for movie_id in movie_ids if movie_id in rows]
+
+    def get_movies_by_exact_title(self, title, fields=MOVIE_FIELDS):
+        """Get every movie with this title (case insensitive)"""
+        query = f"SELECT {movie_columns(fields)} FROM movies m WHERE LOWER(m.title) = LOWER(%s)"
+        self.execute(query, (title,), prepare=True)
+        return self.fetchall()
+        
     def get_movie_by_title(self, title):
         """Get a movie by its title (case insensitive)"""
         query = "SELECT * FROM movies WHERE LOWER(title) = LOWER(%s)"
         self.execute(query, (title,))
         return self.fetchone()
         
-    def get_movies_by_partial_title(self, partial_title):
-        """Get movies that contain the partial title"""
-        query = "SELECT * FROM movies WHERE LOWER(title) LIKE LOWER(%s) LIMIT 5"
-        self.execute(query, (f'%{partial_title}%',))
+    def get_movies_by_partial_title(self, partial_title, limit=5):
+        """Get movies that contain the partial title (unranked, sequential scan)"""
+        query = "SELECT * FROM movies WHERE LOWER(title) LIKE LOWER(%s) LIMIT %s"
+        self.execute(query, (f'%{partial_title}%', limit), prepare=True)
         return self.fetchall()
         
-    def get_similar_movies(self, movie_id, limit=5):
-        """Get the most similar movies for a given movie ID"""
-        query = """
-        SELECT m.*, ms.similarity_score
-        FROM movie_similarities ms
-        JOIN movies m ON ms.target_movie_id = m.movie_id
-        WHERE ms.source_movie_id = %s
-        ORDER BY ms.similarity_score DESC
-        LIMIT %s
+    def search_movies_by_title(self, search_query, limit=10, fields=MOVIE_FIELDS, after=None):
+        """Fuzzy title search ranked by trigram similarity, then popularity
+        
+        Substring matches (LIKE) and typo-tolerant word matches (<%) are both
+        answered from the idx_movies_title_trgm GIN index. Results are ordered
+        by (match_score, rank_popularity, movie_id) descending; pass the last
+        row's values as after to fetch the next page.
+        """
+        self.execute(*self._search_query(search_query, limit, fields, after), prepare=True)
+        return self.fetchall()
+        
+    def search_movies_by_title_json(self, search_query, limit=10, fields=MOVIE_FIELDS, after=None):
+        """search_movies_by_title, with the page rendered as JSON text by Postgres
+        
+        Returns a dict with data (the JSON array, including match_score), count
+        and last (the last row's keyset position, None on an empty page).
+        """
+        query, params = self._search_query(search_query, limit, fields, after)
+        self.execute(f"""
+        SELECT {json_array(fields + ('match_score',), 'r.match_score DESC, r.rank_popularity DESC, r.movie_id DESC')} AS data,
+               COUNT(*) AS count,
+               (array_agg(json_build_array(r.match_score, r.rank_popularity, r.movie_id)
+                          ORDER BY r.match_score, r.rank_popularity, r.movie_id))[1] AS last
+        FROM ({query}) r
+        """, params, prepare=True)
+        return self.fetchone()
+        
+    def _search_query(self, search_query, limit, fields, after):
+        # match_score is real: compared as float8, the cursor's score would sort
+        # below the boundary row and its ties, and the same page would repeat
+        keyset = ("WHERE (match_score, rank_popularity, movie_id) < (%(score)s::real, %(popularity)s, %(movie_id)s)"
+                  if after else "")
+        query = f"""
+        SELECT * FROM (
+            SELECT {movie_columns(fields)},
+                   word_similarity(%(q)s, LOWER(m.title)) + similarity(%(q)s, LOWER(m.title)) AS match_score,
+                   COALESCE(m.popularity, 0) AS rank_popularity
+            FROM movies m
+            WHERE LOWER(m.title) LIKE %(pattern)s OR %(q)s <%% LOWER(m.title)
+        ) ranked
+        {keyset}
+        ORDER BY match_score DESC, rank_popularity DESC, movie_id DESC
+        LIMIT %(limit)s
+        """
+        search_query = search_query.lower()
+        params = {
+            'q': search_query,
+            'pattern': f'%{escape_like(search_query)}%',
+            'limit': limit
+        }
+        if after:
+            params['score'], params['popularity'], params['movie_id'] = after
+        return query, params
+        
+    def get_similar_movies(self, movie_id, limit=5, fields=MOVIE_SUMMARY_FIELDS, filters=None, storage=None):
+        """Get the most similar movies for a given movie ID
+        
+        filters (see movie_filter_clause) are applied to the stored candidate
+        pool, so fewer than limit movies may match. storage overrides
+        NEIGHBOR_STORAGE.
         """
-        self.execute(query, (movie_id, limit))
+        self.execute(*self._similar_movies_query(movie_id, limit, fields, filters, storage), prepare=True)
         return self.fetchall()
         
+    def get_similar_movies_json(self, movie_id, limit=5, fields=MOVIE_SUMMARY_FIELDS, filters=None, storage=None):
+        """get_similar_movies, with the list rendered as JSON text by Postgres
+        
+        Returns a dict with data (the JSON array of fields plus
+        similarity_score), count, and the genre_masks and vote_averages the
+        evaluation metrics need, in the same order.
+        """
+        query_fields = tuple(dict.fromkeys(fields + ('genre_mask', 'vote_average')))
+        query, params = self._similar_movies_query(movie_id, limit, query_fields, filters, storage)
+        order = 'r.similarity_score DESC'
+        self.execute(f"""
+        SELECT {json_array(fields + ('similarity_score',), order)} AS data,
+               COUNT(*) AS count,
+               COALESCE(array_agg(r.genre_mask ORDER BY {order}), '{{}}') AS genre_masks,
+               COALESCE(array_agg(r.vote_average ORDER BY {order}), '{{}}') AS vote_averages
+        FROM ({query}) r
+        """, params, prepare=True)
+        return self.fetchone()
+        
+    def _similar_movies_query(self, movie_id, limit, fields, filters, storage):
+        conditions, params = movie_filter_clause(filters or {})
+        if (storage or NEIGHBOR_STORAGE) == 'arrays':
+            # One primary key lookup, unpacked in rank order. Without filters
+            # only the first limit entries are unpacked, so only they are
+            # joined to movies; filters need the whole pool to pick from.
+            if conditions:
+                targets, head = 'mn.target_ids, mn.scores', ()
+            else:
+                targets, head = 'mn.target_ids[1:%s], mn.scores[1:%s]', (limit, limit)
+            query = f"""
+            SELECT {movie_columns(fields)}, n.similarity_score
+            FROM movie_neighbors mn
+            CROSS JOIN LATERAL unnest({targets})
+                WITH ORDINALITY AS n(target_movie_id, similarity_score, rank)
+            JOIN movies m ON n.target_movie_id = m.movie_id
+            WHERE mn.source_movie_id = %s{conditions}
+            ORDER BY n.rank
+            LIMIT %s
+            """
+        else:
+            head = ()
+            query = f"""
+            SELECT {movie_columns(fields)}, ms.similarity_score
+            FROM movie_similarities ms
+            JOIN movies m ON ms.target_movie_id = m.movie_id
+            WHERE ms.source_movie_id = %s{conditions}
+            ORDER BY ms.similarity_score DESC
+            LIMIT %s
+            """
+        return query, (*head, movie_id, *params, limit)
+        
+    def get_similar_movies_for_many(self, movie_ids, limit=5, fields=MOVIE_SUMMARY_FIELDS, storage=None):
+        """get_similar_movies (unfiltered) for several movies in one query
+        
+        Returns {movie_id: [similar movies in rank order]}; movies without
+        stored neighbours are left out.
+        """
+        if (storage or NEIGHBOR_STORAGE) == 'arrays':
+            # Only the first limit entries of each pool are unpacked and joined
+            query = f"""
+            SELECT mn.source_movie_id, {movie_columns(fields)}, n.similarity_score
+            FROM movie_neighbors mn
+            CROSS JOIN LATERAL unnest(mn.target_ids[1:%s], mn.scores[1:%s])
+                WITH ORDINALITY AS n(target_movie_id, similarity_score, rank)
+            JOIN movies m ON n.target_movie_id = m.movie_id
+            WHERE mn.source_movie_id = ANY(%s)
+            ORDER BY mn.source_movie_id, n.rank
+            """
+            params = (limit, limit, list(movie_ids))
+        else:
+            query = f"""
+            SELECT r.source_movie_id, {movie_columns(fields, 'r')}, r.similarity_score
+            FROM (
+                SELECT ms.source_movie_id, {movie_columns(fields)}, ms.similarity_score,
+                       row_number() OVER (PARTITION BY ms.source_movie_id
+                                          ORDER BY ms.similarity_score DESC) AS rank
+                FROM movie_similarities ms
+                JOIN movies m ON ms.target_movie_id = m.movie_id
+                WHERE ms.source_movie_id = ANY(%s)
+            ) r
+            WHERE r.rank <= %s
+            ORDER BY r.source_movie_id, r.rank
+            """
+            params = (list(movie_ids), limit)
+        self.execute(query, params)
+        similar = {}
+        for row in self.fetchall():
+            similar.setdefault(row.pop('source_movie_id'), []).append(row)
+        return similar
+        
+    def get_movie_ids_by_popularity(self, limit=None):
+        """Get movie IDs, most popular first (all of them without a limit)"""
+        self.execute("SELECT movie_id FROM movies ORDER BY popularity DESC NULLS LAST, movie_id LIMIT %s",
+                     (limit,))
+        return [row['movie_id'] for row in self.fetchall()]
+        
+    def get_movie_ids_matching(self, filters):
+        """Get the IDs of every movie that passes the filters (see movie_filter_clause)"""
+        conditions, params = movie_filter_clause(filters)
+        self.execute(f"SELECT m.movie_id FROM movies m WHERE TRUE{conditions}", params)
+        return [row['movie_id'] for row in self.fetchall()]
+        
     def store_movie_similarity(self, source_id, target_id, score):
         """Store a similarity score between two movies"""
         query = """
@@ -112,12 +491,32 @@ class Database:
     def get_visualization(self, movie_id, viz_type):
         """Get a stored visualization for a movie"""
         query = """
-        SELECT * FROM visualizations
+        SELECT image_data, created_at FROM visualizations
         WHERE movie_id = %s AND visualization_type = %s
         """
-        self.execute(query, (movie_id, viz_type))
+        self.execute(query, (movie_id, viz_type), prepare=True)
         return self.fetchone()
         
+    def delete_visualizations_before(self, cutoff, batch_size=1000):
+        """Delete visualizations created before cutoff in short batches
+        
+        Each batch commits separately so no long transaction holds locks on
+        the table. Returns the number of rows deleted, or None if a batch failed.
+        """
+        query = """
+        DELETE FROM visualizations
+        WHERE id IN (
+            SELECT id FROM visualizations WHERE created_at < %s LIMIT %s
+        )
+        """
+        deleted = 0
+        while True:
+            if not self.execute(query, (cutoff, batch_size), commit=True):
+                return None
+            deleted += self.cursor.rowcount
+            if self.cursor.rowcount < batch_size:
+                return deleted
+        
     def store_visualization(self, movie_id, viz_type, image_data):
         """Store a visualization image for a movie"""
         query = """
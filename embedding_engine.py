@@ -0,0 +1,103 @@
+import os
+import numpy as np
+
+EMBEDDINGS_FILE = 'movie_embeddings.npy'
+EMBEDDING_IDS_FILE = 'movie_embedding_ids.npy'
+
+RECOMMENDATION_METHODS = ('centroid', 'fusion')
+
+def save_embeddings(directory, movie_ids, vectors):
+    """Write L2-normalized float32 embeddings ordered by movie id
+
+    Each file is written under a temporary name and renamed into place, so a
+    running API keeps reading the old files until it reloads.
+    """
+    # Sorted, and only the first row of a movie listed twice is kept
+    ids, first_rows = np.unique(np.asarray(movie_ids, dtype=np.int64), return_index=True)
+    vectors = np.asarray(vectors, dtype=np.float32)[first_rows]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in ((EMBEDDINGS_FILE, vectors), (EMBEDDING_IDS_FILE, ids)):
+        path = os.path.join(directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+
+class EmbeddingEngine:
+    """Nearest-neighbour search over the movie embeddings written by the import
+
+    Rows are L2-normalized, so a dot product is the cosine similarity, and
+    ordered by movie id, so a movie's row is found by binary search. The
+    matrix is memory-mapped: workers forked from the same master share its
+    pages through the OS page cache.
+    """
+
+    def __init__(self, ids, vectors):
+        if len(ids) != len(vectors):
+            raise ValueError(f"{len(ids)} ids for {len(vectors)} embeddings")
+        self.ids = ids
+        self.vectors = vectors
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map the embeddings in directory"""
+        ids = np.load(os.path.join(directory, EMBEDDING_IDS_FILE))
+        vectors = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+        return cls(ids, vectors)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, movie_id):
+        return len(self.rows([movie_id])) > 0
+
+    def rows(self, movie_ids):
+        """Return the row numbers of the given movie ids, skipping unknown ones"""
+        movie_ids = np.asarray(list(movie_ids), dtype=np.int64)
+        if not len(movie_ids) or not len(self.ids):
+            return np.empty(0, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.ids, movie_ids), len(self.ids) - 1)
+        return positions[self.ids[positions] == movie_ids]
+
+    def recommend(self, seed_ids, limit=10, exclude=(), method='centroid', allowed=None):
+        """Return up to limit (movie_id, score) pairs most similar to the seed movies
+
+        centroid scores every movie against the mean of the seeds; fusion
+        scores it by its best match among the seeds, so movies close to any
+        one seed rank high. The seeds and the exclude ids are never returned;
+        when allowed is given only those movie ids are.
+        """
+        if method not in RECOMMENDATION_METHODS:
+            raise ValueError(f"unknown method: {method}")
+
+        seeds = self.rows(seed_ids)
+        if not len(seeds) or limit <= 0:
+            return []
+
+        seed_vectors = np.asarray(self.vectors[seeds])
+        if method == 'centroid' or len(seeds) == 1:
+            query = seed_vectors.mean(axis=0)
+            query /= np.linalg.norm(query) or 1
+            scores = self.vectors @ query
+        else:
+            # One matrix-vector product per seed is about twice as fast as a
+            # single matrix-matrix product against a handful of seeds
+            scores = self.vectors @ seed_vectors[0]
+            for seed_vector in seed_vectors[1:]:
+                np.maximum(scores, self.vectors @ seed_vector, out=scores)
+
+        if allowed is not None:
+            # Scoring everything and masking is cheaper than gathering the allowed rows
+            allowed_rows = self.rows(allowed)
+            masked = np.full_like(scores, -np.inf)
+            masked[allowed_rows] = scores[allowed_rows]
+            scores = masked
+        scores[seeds] = -np.inf
+        scores[self.rows(exclude)] = -np.inf
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.ids[row]), float(scores[row])) for row in top if np.isfinite(scores[row])]
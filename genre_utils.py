@@ -0,0 +1,51 @@
+import numpy as np
+
+# Each genre is one bit of movies.genre_mask (a BIGINT, so 63 usable bits)
+MAX_GENRES = 63
+
+# Number of set bits in every byte value
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def assign_genre_bits(genre_lists):
+    """Give the most common genre names bit positions 0, 1, 2, ...
+
+    genre_lists holds one list of genre names per movie. Returns the names in
+    bit order; genres beyond MAX_GENRES get no bit.
+    """
+    counts = {}
+    for names in genre_lists:
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+    return sorted(counts, key=lambda name: (-counts[name], name))[:MAX_GENRES]
+
+def genre_mask(names, bits):
+    """Pack genre names into a bitmask using bits ({name: bit position})"""
+    mask = 0
+    for name in names:
+        if name in bits:
+            mask |= 1 << bits[name]
+    return mask
+
+def genre_names(mask, lookup):
+    """Unpack a bitmask into genre names using lookup (names in bit order)"""
+    if not mask or not lookup:
+        return []
+    return [name for bit, name in enumerate(lookup) if mask >> bit & 1]
+
+def popcount(masks):
+    """Count the set bits of each value in an array of 64-bit masks"""
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    return _POPCOUNT_TABLE[masks.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def mask_bits(masks, n_bits=MAX_GENRES):
+    """Expand 64-bit masks into a (len(masks), n_bits) 0/1 matrix"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    return (masks[:, None] >> np.arange(n_bits, dtype=np.uint64) & np.uint64(1)).astype(np.float64)
+
+def load_genre_lookup(db):
+    """Read the genre names in bit order from the genres table"""
+    db.execute("SELECT genre_id, name FROM genres ORDER BY genre_id")
+    lookup = [None] * MAX_GENRES
+    for row in db.fetchall():
+        lookup[row['genre_id']] = row['name']
+    return tuple(lookup)
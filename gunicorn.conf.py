@@ -0,0 +1,61 @@
+# gunicorn.conf.py
+# Production serving configuration for the API (see Dockerfile.api)
+import gc
+import multiprocessing
+import os
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '5000')}"
+
+# Worker processes and threads per worker
+workers = int(os.getenv('API_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('API_THREADS', 4))
+worker_class = 'gthread'
+
+# Import api.py once in the master so read-only state is shared copy-on-write
+preload_app = True
+
+timeout = int(os.getenv('API_WORKER_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('API_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('API_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth (0 disables)
+max_requests = int(os.getenv('API_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('API_MAX_REQUESTS_JITTER', 0))
+
+# Workers write metrics snapshots here so /api/metrics covers all of them
+# (set before api.py imports instrumentation)
+os.environ.setdefault('METRICS_DIR', '/tmp/movie-api-metrics')
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('API_LOG_LEVEL', 'info')
+
+
+def _load_shared_state(server):
+    """Load read-only state in the master and freeze it out of the GC"""
+    import api
+    api.load_shared_state()
+    api.warm_up_renderer()
+    # Objects loaded so far are never freed; moving them to the permanent
+    # generation stops the collector in each worker from touching (and so
+    # copying) their pages.
+    gc.freeze()
+    server.log.info(f"Shared state loaded: {', '.join(api.shared_state) or 'none'}")
+
+
+def when_ready(server):
+    import instrumentation
+    instrumentation.clear_snapshots()
+    _load_shared_state(server)
+
+
+def on_reload(server):
+    # SIGHUP: refresh shared state in the master, then gunicorn replaces the
+    # workers gracefully so they fork from the new copy
+    gc.unfreeze()
+    _load_shared_state(server)
+
+
+def post_worker_init(worker):
+    import api
+    api.warm_up_worker()
@@ -9,9 +9,28 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler
 from sklearn.decomposition import TruncatedSVD
 from scipy.sparse import hstack, csr_matrix
-from db_utils import Database
+from psycopg2.extras import execute_values
+from db_utils import Database, NEIGHBOR_STORAGE
+from cache_utils import RedisCache, CACHE_DOMAINS, RECOMMENDATION_CACHE_DEPTH
+from embedding_engine import save_embeddings
+from genre_utils import assign_genre_bits, genre_mask
 import time
 
+# Neighbours stored per movie; filtered recommendations are picked from these
+CANDIDATE_POOL_SIZE = int(os.getenv('CANDIDATE_POOL_SIZE', 200))
+
+# Embeddings for the API's recommendation engine (see embedding_engine.py)
+EMBEDDINGS_DIR = os.getenv('EMBEDDINGS_DIR', 'data')
+EMBEDDING_DIMS = int(os.getenv('EMBEDDING_DIMS', 256))
+
+# Source dataset (benchmarks/synthetic.py writes catalogs in the same layout)
+MOVIES_CSV = os.getenv('MOVIES_CSV', 'data/movies_metadata.csv')
+
+# Recommendation lists written to Redis before the new data is published:
+# the CACHE_WARM_TOP_N most popular movies (0 for all of them, -1 for none)
+CACHE_WARM_TOP_N = int(os.getenv('CACHE_WARM_TOP_N', 0))
+CACHE_WARM_BATCH_SIZE = int(os.getenv('CACHE_WARM_BATCH_SIZE', 500))
+
 def preprocess_movie_data(csv_path):
     """Process the movie data CSV file and prepare it for database import"""
     print(f"Loading data from {csv_path}...")
@@ -50,7 +69,7 @@ def preprocess_movie_data(csv_path):
     # Select and rename columns for the database
     db_movies = movies_df[[
         'id', 'title', 'release_date', 'overview', 'vote_average',
-        'budget', 'revenue', 'runtime', 'collection_name', 'genres_json'
+        'vote_count', 'popularity', 'budget', 'revenue', 'runtime', 'collection_name', 'genres_json'
     ]].copy()
     
     db_movies.rename(columns={
@@ -63,6 +82,10 @@ def preprocess_movie_data(csv_path):
         db_movies[col] = pd.to_numeric(db_movies[col], errors='coerce')
         # Replace 0s with NaN
         db_movies[col] = db_movies[col].replace(0, np.nan)
+
+    # Popularity signals are used to rank search results
+    for col in ['vote_average', 'vote_count', 'popularity']:
+        db_movies[col] = pd.to_numeric(db_movies[col], errors='coerce')
     
     # Parse release dates
     db_movies['release_date'] = pd.to_datetime(db_movies['release_date'], errors='coerce')
@@ -74,6 +97,62 @@ def preprocess_movie_data(csv_path):
     print(f"Processed {len(db_movies)} movies.")
     return db_movies, movies_df
 
+def import_genres(db_movies, movies_df):
+    """Store the genre lookup table and add each movie's genre bitmask to db_movies"""
+    genre_lists = movies_df['genres'].apply(
+        lambda x: [genre['name'] for genre in x if isinstance(genre, dict) and 'name' in genre] if isinstance(x, list) else []
+    )
+    lookup = assign_genre_bits(genre_lists)
+    bits = {name: bit for bit, name in enumerate(lookup)}
+    db_movies['genre_mask'] = genre_lists.apply(lambda names: genre_mask(names, bits))
+    
+    with Database() as db:
+        for bit, name in enumerate(lookup):
+            db.execute(
+                """
+                INSERT INTO genres (genre_id, name) VALUES (%s, %s)
+                ON CONFLICT (genre_id) DO UPDATE SET name = EXCLUDED.name
+                """,
+                (bit, name)
+            )
+        db.conn.commit()
+    print(f"Stored {len(lookup)} genres.")
+
+def store_neighbor_arrays(db, similarity_data):
+    """Write {(source, target): score} as one movie_neighbors row per source, best first"""
+    neighbors = {}
+    for (source, target), score in similarity_data.items():
+        neighbors.setdefault(source, []).append((score, target))
+    
+    rows = []
+    for source, scored in neighbors.items():
+        scored.sort(reverse=True)
+        scored = scored[:CANDIDATE_POOL_SIZE]
+        rows.append((source, [target for _, target in scored], [score for score, _ in scored]))
+    
+    execute_values(
+        db.cursor,
+        """
+        INSERT INTO movie_neighbors (source_movie_id, target_ids, scores)
+        VALUES %s
+        ON CONFLICT (source_movie_id)
+        DO UPDATE SET target_ids = EXCLUDED.target_ids, scores = EXCLUDED.scores
+        """,
+        rows,
+        template="(%s, %s::int4[], %s::float4[])",
+        page_size=100
+    )
+
+def candidate_pool(similarities, self_idx, pool_size=CANDIDATE_POOL_SIZE):
+    """Indices of the pool_size highest scores in a row of similarities, excluding self_idx
+    
+    argpartition finds them without sorting the whole row. The row is
+    modified in place.
+    """
+    similarities[self_idx] = -np.inf
+    pool_size = min(pool_size, len(similarities) - 1)
+    return np.argpartition(-similarities, pool_size - 1)[:pool_size]
+
 def compute_movie_similarities(movies_df, batch_size=100):
     """Compute and store movie similarities in batches"""
     
@@ -205,6 +284,14 @@ def compute_movie_similarities(movies_df, batch_size=100):
     reduced_features = svd.fit_transform(combined_features)
     print(f"Explained variance ratio: {svd.explained_variance_ratio_.sum():.2f}")
     
+    # Save the leading components for the API's embedding engine. SVD orders
+    # components by variance, so a prefix is the best lower-rank embedding and
+    # keeps a scan of the whole catalog in the low milliseconds.
+    embedding_dims = min(EMBEDDING_DIMS, reduced_features.shape[1])
+    movie_ids = valid_movies_df['id'].map(tmdb_to_movie_id).values
+    save_embeddings(EMBEDDINGS_DIR, movie_ids, reduced_features[:, :embedding_dims])
+    print(f"Saved {embedding_dims}-dimensional embeddings to {EMBEDDINGS_DIR}")
+    
     # Compute similarities in batches and store in database
     with Database() as db:
         num_movies = len(valid_movies_df)
@@ -219,43 +306,41 @@ def compute_movie_similarities(movies_df, batch_size=100):
                 reduced_features
             )
             
-            # Store top similarities for each movie in the batch
+            # Store the candidate pool of each movie in the batch.
+            # Keyed by (source, target): a movie listed twice in the dataset
+            # must not appear twice in one INSERT ... ON CONFLICT statement
+            similarity_data = {}
             for idx, similarities in enumerate(batch_similarities):
                 movie_idx = i + idx
-                tmdb_id = valid_movies_df.iloc[movie_idx]['id']
-                
-                # Get the database movie_id for this movie
-                movie_id = tmdb_to_movie_id[tmdb_id]
+                movie_id = tmdb_to_movie_id[valid_movies_df.iloc[movie_idx]['id']]
                 
-                # Get indices of top similar movies (excluding self)
-                top_indices = similarities.argsort()[::-1][1:11]  # Top 10 excluding self
-                
-                # Batch insert similarities
-                similarity_data = []
-                for target_idx in top_indices:
-                    target_tmdb_id = valid_movies_df.iloc[target_idx]['id']
-                    target_movie_id = tmdb_to_movie_id[target_tmdb_id]
-                    score = similarities[target_idx]
-                    
-                    similarity_data.append((movie_id, target_movie_id, score))
-                
-                # Use executemany for better performance
-                if similarity_data:
-                    try:
-                        db.cursor.executemany(
+                for target_idx in candidate_pool(similarities, movie_idx):
+                    target_movie_id = movie_ids[target_idx]
+                    if target_movie_id != movie_id:
+                        similarity_data[(movie_id, int(target_movie_id))] = float(similarities[target_idx])
+            
+            # One multi-row INSERT per page instead of a round trip per row
+            if similarity_data:
+                try:
+                    if NEIGHBOR_STORAGE == 'arrays':
+                        store_neighbor_arrays(db, similarity_data)
+                    else:
+                        execute_values(
+                            db.cursor,
                             """
                             INSERT INTO movie_similarities 
                             (source_movie_id, target_movie_id, similarity_score)
-                            VALUES (%s, %s, %s)
+                            VALUES %s
                             ON CONFLICT (source_movie_id, target_movie_id) 
                             DO UPDATE SET similarity_score = EXCLUDED.similarity_score
                             """,
-                            similarity_data
+                            [(source, target, score) for (source, target), score in similarity_data.items()],
+                            page_size=1000
                         )
-                        db.conn.commit()
-                    except Exception as e:
-                        db.conn.rollback()
-                        print(f"Error inserting similarities for movie {tmdb_id}: {e}")
+                    db.conn.commit()
+                except Exception as e:
+                    db.conn.rollback()
+                    print(f"Error inserting similarities for batch {i+1} to {batch_end}: {e}")
             
             # Calculate and print progress
             progress = min(100, (batch_end / num_movies) * 100)
@@ -305,24 +390,27 @@ def import_movies_to_db(db_movies):
                 release_date = movie['release_date'] if pd.notnull(movie['release_date']) else None
                 overview = str(movie['overview']) if pd.notnull(movie['overview']) else ''
                 vote_average = float(movie['vote_average']) if pd.notnull(movie['vote_average']) else None
+                vote_count = int(movie['vote_count']) if pd.notnull(movie['vote_count']) else None
+                popularity = float(movie['popularity']) if pd.notnull(movie['popularity']) else None
                 budget = float(movie['budget']) if pd.notnull(movie['budget']) else None
                 revenue = float(movie['revenue']) if pd.notnull(movie['revenue']) else None
                 runtime = float(movie['runtime']) if pd.notnull(movie['runtime']) else None
                 collection_name = movie['collection_name'] if pd.notnull(movie['collection_name']) else None
                 genres = movie['genres'] if pd.notnull(movie['genres']) else '[]'
+                mask = int(movie['genre_mask']) if pd.notnull(movie['genre_mask']) else 0
                 
                 # Execute the insert
                 db.execute(
                     """
                     INSERT INTO movies 
-                    (tmdb_id, title, release_date, overview, vote_average, 
-                    budget, revenue, runtime, collection_name, genres)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)
+                    (tmdb_id, title, release_date, overview, vote_average, vote_count,
+                    popularity, budget, revenue, runtime, collection_name, genres, genre_mask)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s)
                     ON CONFLICT (tmdb_id) DO NOTHING
                     """,
                     (
-                        tmdb_id, title, release_date, overview, vote_average,
-                        budget, revenue, runtime, collection_name, genres
+                        tmdb_id, title, release_date, overview, vote_average, vote_count,
+                        popularity, budget, revenue, runtime, collection_name, genres, mask
                     ),
                     commit=(i % 100 == 99)  # Commit every 100 rows
                 )
@@ -352,6 +440,37 @@ def import_movies_to_db(db_movies):
     print(f"Movie import completed in {time.time() - start_time:.1f} seconds.")
     return success_count
 
+def warm_recommendation_cache(cache, generation, top_n=CACHE_WARM_TOP_N, batch_size=CACHE_WARM_BATCH_SIZE):
+    """Write the recommendation lists the API caches, under the given generation
+    
+    Movies are read most popular first, batch_size at a time in one query,
+    and each batch is written to Redis in one pipeline. Lists shorter than
+    the cache depth are left to the API, which tops them up from the
+    embedding engine. Returns the number of keys written.
+    """
+    start_time = time.time()
+    with Database() as db:
+        movie_ids = db.get_movie_ids_by_popularity(top_n or None)
+        
+        written = 0
+        for i in range(0, len(movie_ids), batch_size):
+            batch_start = time.perf_counter()
+            similar = db.get_similar_movies_for_many(movie_ids[i:i + batch_size], RECOMMENDATION_CACHE_DEPTH)
+            # What one list costs the API to compute, for its early refresh
+            compute_ms = (time.perf_counter() - batch_start) * 1000 / max(len(similar), 1)
+            entries = [(cache.recommendations_key(movie_id, generation), recommendations, compute_ms)
+                       for movie_id, recommendations in similar.items()
+                       if len(recommendations) == RECOMMENDATION_CACHE_DEPTH]
+            if entries and not cache.set_many(entries):
+                print("Redis unavailable, stopping the cache warm-up.")
+                break
+            written += len(entries)
+            print(f"Warmed {written} of {len(movie_ids)} recommendation lists...")
+    
+    elapsed = time.time() - start_time
+    print(f"Cache warm-up wrote {written} keys in {elapsed:.1f} seconds ({written / max(elapsed, 1e-6):.0f} keys/s).")
+    return written
+
 def main():
     """Main function to import data and compute similarities"""
     # Setup database tables
@@ -361,7 +480,8 @@ def main():
         print("Database schema created successfully.")
     
     # Process and import movies
-    db_movies, movies_df = preprocess_movie_data('data/movies_metadata.csv')
+    db_movies, movies_df = preprocess_movie_data(MOVIES_CSV)
+    import_genres(db_movies, movies_df)
     success_count = import_movies_to_db(db_movies)
     
     # Only compute similarities if we have successfully imported movies
@@ -371,6 +491,26 @@ def main():
         print("Data import and similarity computation completed successfully!")
     else:
         print("No movies were imported, skipping similarity computation.")
+    
+    # Invalidate API caches built from the previous import. Recommendation
+    # lists are written first under the generation about to start, so the
+    # API switches straight to a warm cache.
+    with RedisCache() as cache:
+        warm_generation = None
+        if success_count > 0 and CACHE_WARM_TOP_N >= 0 and cache.client:
+            warm_generation = cache.get_generation('recommendations') + 1
+            warm_recommendation_cache(cache, warm_generation)
+        
+        for domain in CACHE_DOMAINS:
+            generation = cache.invalidate(domain)
+            if generation is None:
+                print("Redis unavailable, API caches not invalidated.")
+                break
+            removed = cache.collect_stale_keys(domain)
+            print(f"Cache domain '{domain}' is now generation {generation} ({removed} stale keys removed).")
+            if domain == 'recommendations' and warm_generation not in (None, generation):
+                print(f"Recommendations were warmed for generation {warm_generation}, which another "
+                      f"invalidation skipped; the API will fill the cache on demand.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
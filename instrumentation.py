@@ -0,0 +1,252 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_request_duration_seconds': 'API request latency by route',
+    'stage_duration_seconds': 'Time spent in each stage of a request',
+    'cache_requests_total': 'Cache lookups by tier and result',
+    'concurrency_wait_seconds': 'Time spent queued for a concurrency limit slot',
+    'concurrency_active': 'Requests holding a concurrency limit slot',
+    'concurrency_queued': 'Requests waiting for a concurrency limit slot',
+    'requests_shed_total': 'Requests turned away by a concurrency limit'
+}
+
+class Registry:
+    """Histograms, counters and gauges for one process
+
+    Values are keyed by (metric name, sorted label pairs). Recording takes one
+    uncontended lock and a bisect, so it is cheap enough for every request.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        """Add a latency sample to a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                histogram = self.histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def increment(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge to its current value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def snapshot(self):
+        """Copy the current values in a JSON-friendly form"""
+        with self._lock:
+            return {
+                'histograms': [[name, list(map(list, labels)), list(buckets), total, count]
+                               for (name, labels), (buckets, total, count) in self.histograms.items()],
+                'counters': [[name, list(map(list, labels)), value]
+                             for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(map(list, labels)), value]
+                           for (name, labels), value in self.gauges.items()]
+            }
+
+registry = Registry()
+
+def observe(name, seconds, **labels):
+    registry.observe(name, seconds, **labels)
+
+def increment(name, amount=1, **labels):
+    registry.increment(name, amount, **labels)
+
+def set_gauge(name, value, **labels):
+    registry.set_gauge(name, value, **labels)
+
+# Stage timings of the request this thread is serving, while it is traced
+_trace = threading.local()
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request (stage_duration_seconds)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('stage_duration_seconds', elapsed, stage=name)
+        timings = getattr(_trace, 'timings', None)
+        if timings is not None:
+            timings.append((name, elapsed))
+
+def start_trace():
+    """Also collect the stage timings of this thread's current request"""
+    _trace.timings = []
+
+def finish_trace():
+    """Stop collecting and return the (stage, seconds) pairs recorded since start_trace"""
+    timings = getattr(_trace, 'timings', None)
+    _trace.timings = None
+    return timings or []
+
+def server_timing(timings, total=None):
+    """Format stage timings as a Server-Timing header value, one entry per stage"""
+    stages = {}
+    for name, seconds in timings:
+        elapsed, count = stages.get(name, (0.0, 0))
+        stages[name] = (elapsed + seconds, count + 1)
+    entries = [f'{name};dur={elapsed * 1000:.2f};desc="{count}x"' for name, (elapsed, count) in stages.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+def cache_result(tier, result, domain=''):
+    """Count a cache lookup: tier is where it looked, result is hit, miss or skipped"""
+    increment('cache_requests_total', tier=tier, domain=domain, result=result)
+
+# Gunicorn workers each keep their own registry. With METRICS_DIR set, each
+# worker writes snapshots there and a scrape merges all of them, so the
+# numbers cover every worker whichever one answers.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_DUMP_SECONDS = float(os.getenv('METRICS_DUMP_SECONDS', 5))
+# Gauges in a snapshot older than this are left out of a scrape
+METRICS_STALE_SECONDS = float(os.getenv('METRICS_STALE_SECONDS', METRICS_DUMP_SECONDS * 6))
+
+_last_dump = {'at': 0}
+
+def dump_snapshot(force=False):
+    """Write this process's snapshot to METRICS_DIR (at most every METRICS_DUMP_SECONDS)"""
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _last_dump['at'] < METRICS_DUMP_SECONDS:
+        return
+    _last_dump['at'] = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Error writing metrics snapshot: {e}")
+
+def clear_snapshots():
+    """Remove snapshots left by a previous run"""
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')) if METRICS_DIR else []:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _worker_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Exists, but belongs to someone else
+    return True
+
+def _snapshot_is_current(path):
+    """Whether a snapshot's gauges still describe a running worker
+
+    Counters and histograms of a recycled or crashed worker still count
+    towards the totals, but its gauges (requests active or queued) froze
+    when it died and would otherwise be added in for ever.
+    """
+    try:
+        pid = int(os.path.basename(path)[:-len('.json')])
+        age = time.time() - os.path.getmtime(path)
+    except (ValueError, OSError):
+        return False
+    return age <= METRICS_STALE_SECONDS and _worker_alive(pid)
+
+def _collect():
+    """Merge the snapshots of every worker (or just this process without METRICS_DIR)"""
+    if not METRICS_DIR:
+        snapshots = [registry.snapshot()]
+    else:
+        dump_snapshot(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # Being replaced, or half written by a dying worker
+            if not _snapshot_is_current(path):
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+
+    histograms = {}
+    counters = {}
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        # Gauges of live workers add up (e.g. requests queued in all of them)
+        for name, labels, value in snapshot.get('gauges', []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+    return histograms, counters, gauges
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{str(value)}"'.replace('\n', ' ') for name, value in pairs) + '}'
+
+def render_prometheus():
+    """Render every metric in the Prometheus text exposition format"""
+    histograms, counters, gauges = _collect()
+    lines = []
+    for family in sorted({name for name, _ in histograms}):
+        lines.append(f'# HELP {family} {HELP.get(family, family)}')
+        lines.append(f'# TYPE {family} histogram')
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            if name != family:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    for family in sorted({name for name, _ in counters}):
+        lines.append(f'# HELP {family} {HELP.get(family, family)}')
+        lines.append(f'# TYPE {family} counter')
+        for (name, labels), value in sorted(counters.items()):
+            if name == family:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    for family in sorted({name for name, _ in gauges}):
+        lines.append(f'# HELP {family} {HELP.get(family, family)}')
+        lines.append(f'# TYPE {family} gauge')
+        for (name, labels), value in sorted(gauges.items()):
+            if name == family:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
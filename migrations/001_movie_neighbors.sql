@@ -0,0 +1,31 @@
+-- Pack movie_similarities into movie_neighbors: one row per source movie with
+-- its targets and scores in rank order. Safe to run more than once.
+--
+--   psql -d movie_recommender -f migrations/001_movie_neighbors.sql
+--
+-- Then restart the API with NEIGHBOR_STORAGE=arrays. Once it is serving from
+-- movie_neighbors, movie_similarities can be dropped to reclaim its space.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS movie_neighbors (
+    source_movie_id INTEGER PRIMARY KEY REFERENCES movies(movie_id),
+    target_ids INTEGER[] NOT NULL,
+    scores REAL[] NOT NULL
+);
+
+INSERT INTO movie_neighbors (source_movie_id, target_ids, scores)
+SELECT source_movie_id,
+       array_agg(target_movie_id ORDER BY similarity_score DESC, target_movie_id),
+       array_agg(similarity_score::real ORDER BY similarity_score DESC, target_movie_id)
+FROM movie_similarities
+GROUP BY source_movie_id
+ON CONFLICT (source_movie_id)
+DO UPDATE SET target_ids = EXCLUDED.target_ids, scores = EXCLUDED.scores;
+
+-- No query orders the whole table by score
+DROP INDEX IF EXISTS idx_similarities_score;
+
+COMMIT;
+
+ANALYZE movie_neighbors;
@@ -175,6 +175,54 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Title suggestions while typing
+    const movieTitleInput = document.getElementById('movieTitle');
+    const titleSuggestions = document.getElementById('titleSuggestions');
+    let autocompleteTimer = null;
+    let autocompleteController = null;
+    
+    if (movieTitleInput && titleSuggestions) {
+        movieTitleInput.addEventListener('input', function() {
+            const query = movieTitleInput.value.trim();
+            clearTimeout(autocompleteTimer);
+            
+            if (query.length < 2) {
+                titleSuggestions.innerHTML = '';
+                return;
+            }
+            
+            // Debounce keystrokes and cancel any request still in flight
+            autocompleteTimer = setTimeout(function() {
+                if (autocompleteController) {
+                    autocompleteController.abort();
+                }
+                autocompleteController = new AbortController();
+                
+                fetch(`/api/autocomplete?q=${encodeURIComponent(query)}`, { signal: autocompleteController.signal })
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.status !== 'success') {
+                            return;
+                        }
+                        titleSuggestions.innerHTML = '';
+                        data.results.forEach(movie => {
+                            const option = document.createElement('option');
+                            option.value = movie.title;
+                            if (movie.year) {
+                                option.label = `${movie.title} (${movie.year})`;
+                            }
+                            titleSuggestions.appendChild(option);
+                        });
+                    })
+                    .catch(error => {
+                        if (error.name !== 'AbortError') {
+                            console.error('Error fetching suggestions:', error);
+                        }
+                    });
+            }, 150);
+        });
+    }
+    
     // Back to search button
     if (backToSearch) {
         backToSearch.addEventListener('click', function() {
@@ -191,8 +239,8 @@ document.addEventListener('DOMContentLoaded', function() {
         recommendationsContainer.style.display = 'none';
         loadingIndicator.style.display = 'block';
         
-        // Fetch recommendations
-        fetch(`/api/recommendations/${movieId}`)
+        // Fetch recommendations (the page gateway also starts both visualizations)
+        fetch(`/api/page/${movieId}`)
             .then(response => {
                 console.log("Recommendations response status:", response.status);
                 return response.json();
@@ -231,7 +279,9 @@ document.addEventListener('DOMContentLoaded', function() {
         const tableRows = recommendations.map(rec => {
             // Format genres
             let genreNames = '';
-            if (rec.genres) {
+            if (rec.genre_names) {
+                genreNames = rec.genre_names.join(', ');
+            } else if (rec.genres) {
                 if (typeof rec.genres === 'string') {
                     try {
                         const genres = JSON.parse(rec.genres);
@@ -275,8 +325,11 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Set up paths for visualizations with cache-busting
         const timestamp = new Date().getTime();
-        const chartPath = `/api/visualization/similarity_chart/${movieId}?t=${timestamp}`;
-        const wordcloudPath = `/api/visualization/wordcloud/${movieId}?t=${timestamp}`;
+        const visualizations = data.visualizations || {};
+        const chartUrl = (visualizations.similarity_chart || {}).url || `/api/visualization/similarity_chart/${movieId}`;
+        const wordcloudUrl = (visualizations.wordcloud || {}).url || `/api/visualization/wordcloud/${movieId}`;
+        const chartPath = `${chartUrl}?t=${timestamp}`;
+        const wordcloudPath = `${wordcloudUrl}?t=${timestamp}`;
         
         // Create metrics HTML
         const metricsHTML = `
@@ -0,0 +1,93 @@
+"""Keyset pagination of the fuzzy title search, against the Postgres configured in .env
+
+The movies live in a throwaway schema, so an imported catalog is left
+alone. Skipped when no database is reachable.
+"""
+import json
+
+import psycopg2
+import pytest
+
+import db_utils
+from db_utils import Database
+
+SCHEMA = 'test_search_pagination'
+FIELDS = ('movie_id', 'title')
+PAGE_SIZE = 7
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    """Create the schema with titles matching 'mon', many of them tied on score and popularity"""
+    try:
+        conn = psycopg2.connect(**Database().conn_params)
+    except psycopg2.Error as e:
+        pytest.skip(f"No database: {e}")
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.movies (movie_id SERIAL PRIMARY KEY, title TEXT, popularity FLOAT)")
+        titles = [('Monster', 5.0)] * 40 + [('Monsters', None)] * 20 + [
+            (f'{word} {n}', float(n % 3))
+            for n in range(30) for word in ('Mon Oncle', 'Lemon Tree', 'Monday', 'Harmony')
+        ]
+        cursor.executemany(f"INSERT INTO {SCHEMA}.movies (title, popularity) VALUES (%s, %s)", titles)
+    yield
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    conn.close()
+
+
+@pytest.fixture(params=[0, 2], ids=['unpooled', 'pooled'])
+def database(request, catalog, monkeypatch):
+    """A Database on the test schema, without a pool (plain queries) or with one (prepared statements)"""
+    monkeypatch.setenv('PGOPTIONS', f'-c search_path={SCHEMA},public')
+    monkeypatch.setattr(db_utils, 'DB_POOL_SIZE', request.param)
+    monkeypatch.setattr(db_utils, '_pool', {'pid': None, 'pool': None})
+    with Database() as db:
+        yield db
+    if db_utils._pool['pool'] is not None:
+        db_utils._pool['pool'].closeall()
+
+
+def matching_ids(db, query):
+    db.execute(
+        "SELECT movie_id FROM movies WHERE LOWER(title) LIKE %s OR %s <%% LOWER(title)",
+        (f'%{query}%', query))
+    return {row['movie_id'] for row in db.fetchall()}
+
+
+def walk(fetch_page):
+    """Follow cursors until a short page; return every movie id in order"""
+    seen = []
+    after = None
+    for _ in range(1000):
+        ids, after = fetch_page(after)
+        seen.extend(ids)
+        if len(ids) < PAGE_SIZE:
+            return seen
+    pytest.fail(f"Pagination did not end; {len(seen)} rows, {len(set(seen))} unique")
+
+
+def test_search_pages_are_disjoint_and_complete(database):
+    def fetch_page(after):
+        rows = database.search_movies_by_title('mon', PAGE_SIZE, FIELDS, after)
+        last = rows[-1] if rows else None
+        cursor = (last['match_score'], last['rank_popularity'], last['movie_id']) if last else None
+        return [row['movie_id'] for row in rows], cursor
+
+    seen = walk(fetch_page)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == matching_ids(database, 'mon')
+
+
+def test_search_json_pages_are_disjoint_and_complete(database):
+    def fetch_page(after):
+        page = database.search_movies_by_title_json('mon', PAGE_SIZE, FIELDS, after)
+        return [movie['movie_id'] for movie in json.loads(page['data'])], page['last']
+
+    seen = walk(fetch_page)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == matching_ids(database, 'mon')
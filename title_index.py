@@ -0,0 +1,180 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+# Prefixes up to this length match thousands of titles, so their top results
+# are precomputed instead of scanned per request
+PRECOMPUTED_PREFIX_LENGTH = 3
+PRECOMPUTED_TOP_K = 20
+
+# Apostrophes join a word ("schindler's" -> "schindlers"); any other
+# punctuation separates words ("spider-man" -> "spider man")
+_APOSTROPHES = re.compile(r"['\u2019]")
+_NON_WORD = re.compile(r'[^\w\s]')
+
+def normalize_title(text):
+    """Fold case, accents, punctuation and whitespace so equivalent titles compare equal"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _NON_WORD.sub(' ', _APOSTROPHES.sub('', text.casefold()))
+    return ' '.join(text.split())
+
+def _title_keys(normalized):
+    """Index a title under every word start, so 'knight' finds 'The Dark Knight'"""
+    words = normalized.split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+class TitleIndex:
+    """In-memory prefix index over normalized movie titles
+
+    Entries are (key, movie_id) tuples in one sorted list, so a prefix maps to
+    a contiguous range found with two binary searches. Results are ranked by
+    popularity.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.movies = {}
+        self.top_by_prefix = {}
+        self.last_updated = None
+        self.last_refresh_check = 0
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from rows with movie_id, title, release_date, popularity and updated_at"""
+        index = cls()
+        entries = []
+        for row in rows:
+            index._store_movie(row)
+            entries.extend((key, row['movie_id']) for key in index.movies[row['movie_id']]['keys'])
+        entries.sort()
+        index.entries = entries
+        index._precompute_top()
+        index.last_refresh_check = time.time()
+        return index
+
+    def _store_movie(self, row):
+        """Record the display fields for a movie and return its index keys"""
+        release_date = row.get('release_date')
+        keys = _title_keys(normalize_title(row['title']))
+        self.movies[row['movie_id']] = {
+            'title': row['title'],
+            'year': release_date.year if release_date else None,
+            'popularity': float(row['popularity']) if row.get('popularity') is not None else 0.0,
+            'keys': keys
+        }
+        updated_at = row.get('updated_at')
+        if updated_at and (self.last_updated is None or updated_at > self.last_updated):
+            self.last_updated = updated_at
+        return keys
+
+    def _range(self, prefix):
+        """Return the [lo, hi) slice of entries whose key starts with prefix"""
+        lo = bisect.bisect_left(self.entries, (prefix,))
+        hi = bisect.bisect_left(self.entries, (prefix + '\uffff',), lo)
+        return lo, hi
+
+    def _top_in_range(self, lo, hi, k):
+        """Return the k most popular distinct movie ids in entries[lo:hi]"""
+        movie_ids = {movie_id for _, movie_id in self.entries[lo:hi]}
+        return heapq.nlargest(k, movie_ids, key=lambda movie_id: (self.movies[movie_id]['popularity'], -movie_id))
+
+    def _precompute_top(self, prefixes=None):
+        """Refresh the cached results for short prefixes (all of them when prefixes is None)"""
+        if prefixes is None:
+            prefixes = {key[:n] for key, _ in self.entries
+                        for n in range(1, PRECOMPUTED_PREFIX_LENGTH + 1) if len(key) >= n}
+        for prefix in prefixes:
+            lo, hi = self._range(prefix)
+            if lo == hi:
+                self.top_by_prefix.pop(prefix, None)
+            else:
+                self.top_by_prefix[prefix] = self._top_in_range(lo, hi, PRECOMPUTED_TOP_K)
+
+    def complete(self, query, limit=10):
+        """Return the most popular movies with a title word starting with query"""
+        prefix = normalize_title(query)
+        if not prefix:
+            return []
+
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH and limit <= PRECOMPUTED_TOP_K:
+            movie_ids = self.top_by_prefix.get(prefix, [])[:limit]
+        else:
+            lo, hi = self._range(prefix)
+            movie_ids = self._top_in_range(lo, hi, limit)
+
+        results = []
+        for movie_id in movie_ids:
+            movie = self.movies[movie_id]
+            results.append({
+                'movie_id': movie_id,
+                'title': movie['title'],
+                'year': movie['year'],
+                'popularity': movie['popularity']
+            })
+        return results
+
+    def upsert(self, rows):
+        """Apply inserted or updated movies without rebuilding the whole index"""
+        with self._write_lock:
+            touched = set()
+            for row in rows:
+                movie_id = row['movie_id']
+                old = self.movies.get(movie_id)
+                old_keys = old['keys'] if old else set()
+                new_keys = self._store_movie(row)
+
+                for key in old_keys - new_keys:
+                    pos = bisect.bisect_left(self.entries, (key, movie_id))
+                    if pos < len(self.entries) and self.entries[pos] == (key, movie_id):
+                        del self.entries[pos]
+                for key in new_keys - old_keys:
+                    bisect.insort(self.entries, (key, movie_id))
+
+                # Popularity changes reorder results even when the keys are unchanged
+                for key in old_keys | new_keys:
+                    touched.update(key[:n] for n in range(1, PRECOMPUTED_PREFIX_LENGTH + 1) if len(key) >= n)
+
+            self._precompute_top(touched)
+
+    def __len__(self):
+        return len(self.movies)
+
+TITLE_INDEX_QUERY = "SELECT movie_id, title, release_date, popularity, updated_at FROM movies"
+
+def load_title_index(db):
+    """Build a TitleIndex from the movies table"""
+    db.execute(TITLE_INDEX_QUERY)
+    return TitleIndex.from_rows(db.fetchall())
+
+def refresh_title_index(db, index):
+    """Bring index up to date with the movies table
+
+    Returns the index to use from now on: the same object after an
+    incremental update, or a rebuilt one when movies were deleted.
+    """
+    db.execute("SELECT COUNT(*) AS count FROM movies")
+    count = db.fetchone()['count']
+
+    if index.last_updated is None:
+        changed = []
+        if count != len(index):
+            return load_title_index(db)
+    else:
+        # >= so rows committed later with the same timestamp are not missed
+        db.execute(TITLE_INDEX_QUERY + " WHERE updated_at >= %s", (index.last_updated,))
+        changed = db.fetchall()
+
+    new_ids = sum(1 for row in changed if row['movie_id'] not in index.movies)
+    if count != len(index) + new_ids:
+        # Rows were deleted (or missed); this is rare enough to rebuild
+        return load_title_index(db)
+
+    if changed:
+        index.upsert(changed)
+    index.last_refresh_check = time.time()
+    return index